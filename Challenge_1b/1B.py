@@ -146,80 +146,364 @@
 
 #     print("All done.")
 
-import os, json, re
+import time
+_import_start = time.perf_counter()
+import os, json, re, heapq, glob
+from bisect import bisect_right
+from collections import defaultdict
 from datetime import datetime
-from sentence_transformers import SentenceTransformer, util as st_util
-from pdf_extractor import PDFStructureExtractor      # <- your provided extractor
-import fitz
+import numpy as np
+from embeddings import (DEFAULT_BATCH_SIZE, DEFAULT_WINDOW_OVERLAP, EmbeddingCache, cosine_similarities,
+                        embed_texts, embed_token_windows, load_model, model_identity, persona_query,
+                        section_text, set_encoder_threads, startup_report, startup_timings, tokenize_texts, token_windows,
+                        window_size)
+from vector_index import VectorIndex, normalize_rows, top_k_indices
+from pdf_extractor import (ExtractionCache, OutlineBuilder, ParsedDocument, PDFStructureExtractor, ProfileCapture,
+                           available_cpus, imap_documents, metrics, source_name)      # <- your provided extractor
+from manifest import CollectionManifest
+from lexical_index import BM25Index
+startup_timings["import 1B modules"] = time.perf_counter() - _import_start
+
+def _locate_heading(doc, heading):
+    """Return (page index, line y) where a heading starts.
+
+    Uses the y_pos recorded by the extractor when present; otherwise falls back to
+    the first line on the heading's page that contains its text (or the page top).
+    """
+    page_num = heading['page'] - 1
+    if heading.get('y_pos') is not None:
+        return page_num, heading['y_pos']
+    for line in doc.page_lines(page_num):
+        line_text = "".join(span.text for span in line.spans).strip()
+        if heading['text'] in line_text:
+            return page_num, line.y
+    return page_num, 0
+
+# Bump when section chunks change shape, so cached and manifest sections are rebuilt
+SECTIONS_VERSION = "2"
+
+def _page_text(lines):
+    """A page's lines as chunking reads them: (y positions, line texts joined by newlines, text end offsets).
+
+    Much smaller than the page's LineRecords, so a document's text can be kept
+    while its pages stream past until the outline is known.
+    """
+    texts = [" ".join(span.text.strip() for span in line.spans if span.text.strip()) for line in lines]
+    ends = np.cumsum([len(text) + 1 for text in texts]) - 1
+    return np.array([line.y for line in lines], dtype=np.float64), "\n".join(texts), ends
+
+def extract_section_chunks(pdf_path, headings, max_section_length=None):
+    """Section chunks of a PDF: the text under each heading up to the next one.
+
+    pdf_path may be a path or a ParsedDocument already laid out by the
+    extractor. Chunks keep the whole section body unless max_section_length is
+    given; section_text() cuts them for single-input embedding and the output.
+    """
+    doc = pdf_path if isinstance(pdf_path, ParsedDocument) else ParsedDocument(pdf_path)
+    with metrics.stage("chunking"):
+        starts = [_locate_heading(doc, heading) for heading in headings]
+        pages = (_page_text(doc.page_lines(p)) for p in range(len(doc)))
+        results = _section_chunks(os.path.basename(doc.pdf_path), pages, headings, starts, max_section_length)
+    metrics.count("chunks", len(results))
+    return results
+
+def _section_chunks(document, pages, headings, starts, max_section_length):
+    # Section start positions per page, sorted by y, so each line finds its owner by bisection
+    starts_by_page = defaultdict(lambda: ([], []))
+    for idx in sorted(range(len(headings)), key=lambda i: starts[i]):
+        page_num, y_pos = starts[idx]
+        starts_by_page[page_num][0].append(y_pos)
+        starts_by_page[page_num][1].append(idx)
+
+    # Single pass over the document's lines in reading order; consecutive lines of
+    # one section are taken as a single slice of the page text
+    chunks = [[] for _ in headings]
+    active = None  # section still open from an earlier page
+    for p, (line_ys, text, ends) in enumerate(pages):
+        page_ys, page_ids = starts_by_page.get(p, ((), ()))
+        run_owner, run_start, line_start = None, 0, 0
+        for y, line_end in zip(line_ys.tolist(), ends.tolist()):
+            k = bisect_right(page_ys, y) - 1
+            owner = page_ids[k] if k >= 0 else active
+            if owner != run_owner:
+                if run_owner is not None:
+                    chunks[run_owner].append(text[run_start:line_start - 1])
+                run_owner, run_start = owner, line_start
+            line_start = line_end + 1
+        if run_owner is not None:
+            chunks[run_owner].append(text[run_start:line_start - 1])
+        if page_ids:
+            active = page_ids[-1]
 
-def extract_section_chunks(pdf_path, headings, max_section_length=4000):
-    doc = fitz.open(pdf_path)
     results = []
-    # Find heading locations
-    heading_indices = []
-    for heading in headings:
-        page_num = heading['page'] - 1
-        heading_text = heading['text']
-        found = False
-        page = doc[page_num]
-        for block in page.get_text("dict")["blocks"]:
-            if "lines" not in block: continue
-            for line in block["lines"]:
-                line_text = "".join(span["text"] for span in line["spans"]).strip()
-                if heading_text in line_text:
-                    y_pos = round(line["bbox"][1], 1)
-                    heading_indices.append((page_num, y_pos))
-                    found = True
-                    break
-            if found: break
-        if not found:
-            heading_indices.append((page_num, 0))
-    for idx, ((page_num, y_pos), heading) in enumerate(zip(heading_indices, headings)):
-        next_page_num, next_y_pos = heading_indices[idx+1] if idx+1 < len(heading_indices) else (None, None)
-        chunk = []
-        p = page_num
-        while True:
-            page = doc[p]
-            blocks = page.get_text("dict")['blocks']
-            for block in blocks:
-                if "lines" not in block: continue
-                for line in block["lines"]:
-                    line_y = round(line["bbox"][1], 1)
-                    if p == page_num and line_y < y_pos:
-                        continue
-                    if next_page_num is not None:
-                        if (p == next_page_num and line_y >= next_y_pos): break
-                        if (p > next_page_num): break
-                    line_text = " ".join(span['text'].strip() for span in line["spans"] if span["text"].strip())
-                    chunk.append(line_text)
-            if next_page_num is not None and p == next_page_num: break
-            if p+1 >= len(doc): break
-            if next_page_num is not None and p+1 > next_page_num: break
-            p += 1
+    for heading, chunk in zip(headings, chunks):
         body = "\n".join(chunk).strip()
-        if len(body) > max_section_length:
+        if max_section_length is not None and len(body) > max_section_length:
             body = body[:max_section_length] + '...'
         if body:
             results.append({
-                'document': os.path.basename(pdf_path),
+                'document': document,
                 'heading': heading['text'],
                 'page': heading['page'],
                 'chunk': body
             })
-    doc.close()
     return results
 
-def rank_sections_for_persona(sections, persona, job, model_path):
-    model = SentenceTransformer(model_path)
-    query = f"{persona}. {job}"
-    section_texts = [section['chunk'] for section in sections]
-    section_embs = model.encode(section_texts, convert_to_tensor=True, show_progress_bar=False)
-    query_emb = model.encode([query], convert_to_tensor=True)
-    sims = st_util.cos_sim(query_emb, section_embs).cpu().numpy().flatten()
-    for i, section in enumerate(sections):
-        section['similarity'] = float(sims[i])
-    ranked = sorted(sections, key=lambda s: s['similarity'], reverse=True)
-    return ranked
+def extract_document_sections(extractor, pdf_path):
+    """Parse one PDF and return its section chunks; None if it has no headings.
+
+    With an extraction cache on the extractor, unchanged PDFs are answered from
+    the cached sections without opening them.
+    """
+    cache_key = extractor.cache_key(pdf_path)
+    if cache_key:
+        cached = extractor.cache.get(cache_key, f"sections-v{SECTIONS_VERSION}")
+        if cached is not None:
+            return cached["sections"]
+    return _extract_document(extractor, pdf_path, cache_key)[1]
+
+def extract_document(extractor, pdf_path):
+    """Parse one PDF once for both its structure (headings keep their y_pos) and its section chunks.
+
+    Returns (structure, sections), sections being None without headings; both
+    come from the extraction cache when it has them.
+    """
+    cache_key = extractor.cache_key(pdf_path)
+    if cache_key:
+        structure = extractor.cache.get(cache_key, "structure")
+        cached = extractor.cache.get(cache_key, f"sections-v{SECTIONS_VERSION}")
+        if structure is not None and cached is not None:
+            return structure, cached["sections"]
+    return _extract_document(extractor, pdf_path, cache_key)
+
+def _extract_document(extractor, pdf_path, cache_key):
+    # Pages stream through the outline builder one at a time and only their text
+    # is kept for chunking, so memory does not hold every page's layout
+    if extractor.page_workers > 1 and isinstance(pdf_path, str):
+        pdf_path = extractor.parse_document(pdf_path)
+    parsed = isinstance(pdf_path, ParsedDocument)
+    document = os.path.basename(pdf_path.pdf_path if parsed else source_name(pdf_path))
+    builder, pages = None, []
+    for page, builder in extractor.iter_document_structure(pdf_path):
+        with metrics.stage("chunking"):
+            pages.append(_page_text(page.lines))
+    if builder is None:  # no pages
+        builder = OutlineBuilder(extractor, pdf_path.metadata if parsed else {})
+    structure = builder.structure(include_positions=True)
+    headings = structure['outline']
+    metrics.count("headings_kept", len(headings))
+    sections = None
+    if headings:
+        with metrics.stage("chunking"):
+            starts = [(heading['page'] - 1, heading['y_pos']) for heading in headings]
+            sections = _section_chunks(document, pages, headings, starts, None)
+        metrics.count("chunks", len(sections))
+    if cache_key:
+        extractor.cache.put(cache_key, "structure", structure)
+        extractor.cache.put(cache_key, f"sections-v{SECTIONS_VERSION}", {"sections": sections})
+    return structure, sections
+
+def iter_document_sections(pdf_files, workers=1, **extractor_options):
+    """Yield (pdf_path, sections) in file order as extraction finishes; sections is None without headings.
+
+    PDFs that fail to extract are reported and left out.
+    """
+    results = imap_documents(extract_document_sections, pdf_files, workers=workers, **extractor_options)
+    for pdf_path, (sections, error) in zip(pdf_files, results):
+        if error is not None:
+            print(f"Error processing {os.path.basename(pdf_path)}: {error}")
+            continue
+        if sections is None:
+            print(f"No headings found in {os.path.basename(pdf_path)}, skipping.")
+        yield pdf_path, sections
+
+def iter_collection_sections(pdf_files, workers=1, **extractor_options):
+    """Yield section chunks document by document, in file order, as extraction finishes."""
+    for _, sections in iter_document_sections(pdf_files, workers=workers, **extractor_options):
+        if sections:
+            yield from sections
+
+def update_manifest_sections(manifest, pdf_files, workers=1, **extractor_options):
+    """Extract only the PDFs added or changed since the manifest was saved; return every section.
+
+    Sections of unchanged PDFs come from the manifest, and removed PDFs are dropped
+    from it. PDFs that fail are not recorded, so they contribute no sections (not even
+    those of an earlier version) and are retried on the next run.
+    """
+    stale, removed = manifest.refresh(pdf_files)
+    print(f"Manifest: {len(pdf_files) - len(stale)} unchanged, {len(stale)} to extract, {len(removed)} removed")
+    for pdf_path, sections in iter_document_sections(stale, workers=workers, **extractor_options):
+        manifest.record(pdf_path, sections)
+    manifest.save()
+    return manifest.sections(pdf_files)
+
+def rank_sections_for_persona(sections, persona, job, model_path, embedding_cache=None, top_k=None,
+                              batch_size=DEFAULT_BATCH_SIZE, quantize=False):
+    # The model stays loaded between calls; cached section embeddings are not re-encoded.
+    # quantize ranks with the int8 model, whose embedding_cache must be keyed to it
+    model = load_model(model_path, quantize)
+    query = persona_query(persona, job)
+    section_texts = [section_text(section) for section in sections]
+    section_embs = embed_texts(model, section_texts, embedding_cache, batch_size)
+    query_emb = embed_texts(model, [query])[0]
+    with metrics.stage("rank"):
+        sims = cosine_similarities(query_emb, section_embs)
+        for i, section in enumerate(sections):
+            section['similarity'] = float(sims[i])
+        # Partial selection when only the best top_k are needed
+        order = top_k_indices(sims, len(sections) if top_k is None else top_k)
+    return [sections[i] for i in order]
+
+def rank_sections_by_windows(sections, persona, job, model_path, embedding_cache=None, top_k=None, pooling="max",
+                             overlap=DEFAULT_WINDOW_OVERLAP, batch_size=DEFAULT_BATCH_SIZE, quantize=False):
+    """Rank sections by similarity over their whole text, not just what fits in one model input.
+
+    Each whole chunk is tokenized once; sections longer than the model's max_seq_length
+    are split into overlapping token windows, all windows are encoded in batches
+    from those token ids, and a section scores the max or mean of its windows'
+    similarities (pooling "max" / "mean").
+    """
+    if pooling not in ("max", "mean"):
+        raise ValueError(f"Unknown pooling: {pooling}")
+    if not sections:
+        return []
+    model = load_model(model_path, quantize)
+    size = window_size(model)
+    windows, window_counts = [], []
+    for token_ids in tokenize_texts(model, [section['chunk'] for section in sections]):
+        section_windows = token_windows(token_ids, size, overlap)
+        windows.extend(section_windows)
+        window_counts.append(len(section_windows))
+    window_embs = normalize_rows(embed_token_windows(model, windows, embedding_cache, batch_size))
+    query_emb = normalize_rows(embed_texts(model, [persona_query(persona, job)])[0])
+    with metrics.stage("rank"):
+        window_sims = window_embs @ query_emb
+        # A section's windows are contiguous, so each score is one segment reduction
+        counts = np.array(window_counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        if pooling == "max":
+            sims = np.maximum.reduceat(window_sims, starts)
+        else:
+            sims = np.add.reduceat(window_sims, starts) / counts
+        for i, section in enumerate(sections):
+            section['similarity'] = float(sims[i])
+        order = top_k_indices(sims, len(sections) if top_k is None else top_k)
+    return [sections[i] for i in order]
+
+# Rank offset of reciprocal rank fusion; 60 is the usual choice
+RRF_K = 60
+
+def build_lexical_index(sections):
+    """BM25 index over the texts of sections, for rank_sections_hybrid; row i is sections[i]."""
+    with metrics.stage("bm25"):
+        return BM25Index.build([section_text(section) for section in sections])
+
+def rank_sections_hybrid(sections, persona, job, model_path, embedding_cache=None, top_k=10, candidates=100,
+                         fusion=None, batch_size=DEFAULT_BATCH_SIZE, quantize=False, pooling=None, lexical_index=None):
+    """Shortlist sections with BM25, then dense re-rank only the shortlist.
+
+    Only the `candidates` sections that best match the persona query lexically
+    are encoded, so encode work stops growing with the collection. With fusion
+    None the shortlist is ordered by embedding similarity alone; "rrf" orders it
+    by reciprocal rank fusion of the BM25 and embedding ranks. pooling "max" or
+    "mean" re-ranks with rank_sections_by_windows instead. Pass a lexical_index
+    from build_lexical_index(sections) to rank several queries without
+    re-indexing the collection each time.
+    """
+    if fusion not in (None, "rrf"):
+        raise ValueError(f"Unknown fusion method: {fusion}")
+    if lexical_index is None:
+        lexical_index = build_lexical_index(sections)
+    elif len(lexical_index) != len(sections):
+        raise ValueError(f"Lexical index has {len(lexical_index)} texts for {len(sections)} sections")
+    with metrics.stage("bm25"):
+        lexical_order = lexical_index.top_n(persona_query(persona, job), max(candidates, top_k))
+    shortlist = [sections[i] for i in lexical_order]
+    metrics.count("lexical_candidates", len(shortlist))
+
+    def dense_rank(dense_top_k):
+        if pooling:
+            return rank_sections_by_windows(shortlist, persona, job, model_path, embedding_cache, dense_top_k, pooling,
+                                            batch_size=batch_size, quantize=quantize)
+        return rank_sections_for_persona(shortlist, persona, job, model_path, embedding_cache, dense_top_k,
+                                         batch_size, quantize)
+
+    if fusion is None:
+        return dense_rank(top_k)
+
+    dense_order = dense_rank(None)
+    lexical_rank = {id(section): rank for rank, section in enumerate(shortlist)}
+    for rank, section in enumerate(dense_order):
+        section['fusion_score'] = 1 / (RRF_K + rank + 1) + 1 / (RRF_K + lexical_rank[id(section)] + 1)
+    # sorted() is stable, so equal fusion scores keep the dense order
+    return sorted(dense_order, key=lambda section: section['fusion_score'], reverse=True)[:top_k]
+
+def rank_sections_for_personas(sections, queries, model_path, embedding_cache=None, top_k=10,
+                               batch_size=DEFAULT_BATCH_SIZE, quantize=False):
+    """Rank one set of sections for many (persona, job) pairs at once.
+
+    Sections are embedded once and all queries are encoded together; a single
+    section x query similarity matrix then gives each query its own top_k.
+    Returns one ranked list per query, of section copies carrying 'similarity'.
+    """
+    model = load_model(model_path, quantize)
+    section_embs = normalize_rows(embed_texts(model, [section_text(section) for section in sections],
+                                              embedding_cache, batch_size))
+    query_embs = normalize_rows(embed_texts(model, [persona_query(persona, job) for persona, job in queries],
+                                            batch_size=batch_size))
+    with metrics.stage("rank"):
+        sims = section_embs @ query_embs.T
+        rankings = []
+        for q in range(len(queries)):
+            scores = sims[:, q]
+            rankings.append([dict(sections[i], similarity=float(scores[i])) for i in top_k_indices(scores, top_k)])
+    return rankings
+
+def rank_section_stream(section_stream, persona, job, model_path, embedding_cache=None, top_k=10,
+                        batch_size=DEFAULT_BATCH_SIZE, quantize=False):
+    """Rank sections as they arrive, keeping only the top_k best in memory.
+
+    Sections are embedded a window at a time and pushed through a bounded
+    min-heap, so memory stays at top_k sections plus one window however large
+    the collection is. Ties keep arrival order, as in rank_sections_for_persona.
+    """
+    model = load_model(model_path, quantize)
+    query_emb = None
+    heap = []  # (similarity, -arrival, section); heap[0] is the weakest kept section
+    window = []
+    arrival = 0
+
+    def flush():
+        nonlocal query_emb, arrival
+        if not window:
+            return
+        if query_emb is None:
+            query_emb = embed_texts(model, [persona_query(persona, job)])[0]
+        section_embs = embed_texts(model, [section_text(section) for section in window], embedding_cache, batch_size)
+        with metrics.stage("rank"):
+            for section, sim in zip(window, cosine_similarities(query_emb, section_embs)):
+                section['similarity'] = float(sim)
+                entry = (section['similarity'], -arrival, section)
+                arrival += 1
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+        window.clear()
+
+    for section in section_stream:
+        window.append(section)
+        if len(window) >= batch_size * 8:
+            flush()
+    flush()
+    return [section for _, _, section in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
+
+def build_section_index(sections, model_path, embedding_cache=None, batch_size=DEFAULT_BATCH_SIZE, quantize=False):
+    """Embed sections into a VectorIndex that can be saved and queried alongside other collections."""
+    model = load_model(model_path, quantize)
+    section_embs = embed_texts(model, [section_text(section) for section in sections], embedding_cache, batch_size)
+    model_id = embedding_cache.model_id if embedding_cache is not None else model_identity(model_path, quantize)
+    return VectorIndex.build(sections, section_embs, model_id)
 
 def load_challenge_config(config_path):
     """Load persona and job from challenge1b_input.json"""
@@ -258,51 +542,172 @@ def make_final_output(input_files, persona, job, ranked_sections, top_k=10):
         output["subsection_analysis"].append({
             "document": s["document"],
             "section_title": s['heading'],
-            "refined_text": s['chunk'],
+            "refined_text": section_text(s),
             "page_number": s['page']
         })
     return output
 
+def batch_output_path(config_path):
+    """Output file written beside a BATCH_CONFIGS config.
+
+    challenge1b_input_x.json -> challenge1b_output_x.json; any other name.json
+    -> name_output.json. Only that prefix is rewritten, so "input" elsewhere in
+    the name (or a directory) is left alone.
+    """
+    stem = os.path.splitext(os.path.basename(config_path))[0]
+    if stem.startswith("challenge1b_input"):
+        output_name = "challenge1b_output" + stem[len("challenge1b_input"):] + ".json"
+    else:
+        output_name = stem + "_output.json"
+    return os.path.join(os.path.dirname(config_path), output_name)
+
 
 if __name__ == "__main__":
     INPUT_DIR = "\PDFs"
     CONFIG_FILE = "challenge1b_input.json"
     OUTPUT_FILE = "challenge1b_output.json"
     MODEL_PATH = "local_model"    # Must point to a local directory
-
-    # Load persona and job from configuration file
-    persona, job = load_challenge_config(CONFIG_FILE)
-    if persona is None or job is None:
-        print(f"Failed to load configuration from {CONFIG_FILE}")
+    WORKERS = int(os.environ.get("PDF_WORKERS", available_cpus()))
+    PAGE_WORKERS = int(os.environ.get("PDF_PAGE_WORKERS", 1))
+    CACHE_DIR = os.environ.get("PDF_CACHE_DIR")    # Persistent extraction cache, off when unset
+    CACHE_MAX_MB = int(os.environ.get("PDF_CACHE_MAX_MB", 512))
+    EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR")    # Persistent section embeddings, off when unset
+    INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR")    # Save this collection's section index here, for vector_index.py
+    IVF_LISTS = int(os.environ.get("VECTOR_INDEX_IVF_LISTS", 0))    # IVF lists saved with the index, 0 = none
+    EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    EMBED_THREADS = int(os.environ.get("EMBED_THREADS", available_cpus()))    # torch intra-op threads
+    STREAM_SECTIONS = os.environ.get("STREAM_SECTIONS") == "1"    # Rank in bounded memory as PDFs are extracted
+    MANIFEST_PATH = os.environ.get("COLLECTION_MANIFEST")    # Re-extract only added/changed PDFs, off when unset
+    BATCH_CONFIGS = os.environ.get("BATCH_CONFIGS")    # Glob of config files ranked together, one output each
+    EMBED_INT8 = os.environ.get("EMBED_INT8") == "1"    # Dynamically quantized int8 encoder on CPU
+    LEXICAL_CANDIDATES = int(os.environ.get("LEXICAL_CANDIDATES", 0))    # BM25 shortlist size to re-rank, 0 = off
+    HYBRID_FUSION = os.environ.get("HYBRID_FUSION") or None    # "rrf" fuses BM25 and dense ranks
+    TOKEN_WINDOWS = os.environ.get("TOKEN_WINDOWS") or None    # "max"/"mean": score whole sections by token windows
+    if LEXICAL_CANDIDATES and not BATCH_CONFIGS and (STREAM_SECTIONS or INDEX_DIR):
+        # Both rank every section: the stream has no whole collection to shortlist, the index holds all of it
+        print("LEXICAL_CANDIDATES cannot be combined with STREAM_SECTIONS or VECTOR_INDEX_DIR")
         exit(1)
-    
-    print(f"Loaded configuration:")
-    print(f"Persona: {persona}")
-    print(f"Job to be done: {job}")
+    if os.environ.get("STARTUP_REPORT") == "1":
+        # Where cold-start time went (imports, torch, model load), printed on exit
+        import atexit
+        atexit.register(lambda: print("Startup:\n" + startup_report()))
+    # Stage timings and counters (PIPELINE_METRICS=1) and an optional cProfile/tracemalloc
+    # capture (PIPELINE_PROFILE), reported on exit since the branches below end in exit()
+    profile = ProfileCapture(os.environ.get("PIPELINE_PROFILE"), os.environ.get("PIPELINE_PROFILE_OUT"))
+    if metrics.enabled or profile.mode:
+        import atexit
+        atexit.register(metrics.report)
+        atexit.register(profile.stop)
+        profile.start()
+
+    if BATCH_CONFIGS:
+        # Many personas against this collection: extract and embed once, rank every config
+        configs = []
+        for config_path in sorted(glob.glob(BATCH_CONFIGS)):
+            persona, job = load_challenge_config(config_path)
+            if persona and job:  # also skips earlier outputs matched by the glob
+                configs.append((config_path, persona, job))
+        if not configs:
+            print(f"No usable configurations match {BATCH_CONFIGS}")
+            exit(1)
+        print(f"Loaded {len(configs)} configurations")
+    else:
+        # Load persona and job from configuration file
+        persona, job = load_challenge_config(CONFIG_FILE)
+        if persona is None or job is None:
+            print(f"Failed to load configuration from {CONFIG_FILE}")
+            exit(1)
+        
+        print(f"Loaded configuration:")
+        print(f"Persona: {persona}")
+        print(f"Job to be done: {job}")
 
-    pdf_files = [os.path.join(INPUT_DIR, f) for f in os.listdir(INPUT_DIR) if f.lower().endswith('.pdf')]
+    pdf_files = [os.path.join(INPUT_DIR, f) for f in sorted(os.listdir(INPUT_DIR)) if f.lower().endswith('.pdf')]
     if not pdf_files:
         print("No PDF files found.")
         exit(1)
 
-    extractor = PDFStructureExtractor()
-    all_sections = []
+    cache = ExtractionCache(CACHE_DIR, max_bytes=CACHE_MAX_MB * 1024 * 1024) if CACHE_DIR else None
 
-    for pdf_path in pdf_files:
-        doc_struct = extractor.extract_document_structure(pdf_path)
-        headings = doc_struct['outline']
-        if not headings:
-            print(f"No headings found in {os.path.basename(pdf_path)}, skipping.")
-            continue
-        sections = extract_section_chunks(pdf_path, headings)
-        all_sections.extend(sections)
+    # Documents are independent, so extract them in a process pool
+    if MANIFEST_PATH:
+        # Only added or changed PDFs are extracted; the rest come from the manifest
+        manifest = CollectionManifest(MANIFEST_PATH, f"{PDFStructureExtractor().config_version()}-s{SECTIONS_VERSION}")
+        section_stream = update_manifest_sections(manifest, pdf_files, workers=WORKERS,
+                                                  page_workers=PAGE_WORKERS, cache=cache)
+        if not EMBEDDING_CACHE_DIR:
+            # The manifest's embedding ids refer to this cache, kept next to it
+            EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(MANIFEST_PATH)), "embeddings")
+    else:
+        section_stream = iter_collection_sections(pdf_files, workers=WORKERS, page_workers=PAGE_WORKERS, cache=cache)
+    embedding_cache = None
+    if EMBEDDING_CACHE_DIR:
+        embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR,
+                                         model_identity(MODEL_PATH, EMBED_INT8, EMBEDDING_CACHE_DIR))
 
-    if not all_sections:
-        print("No sections were found in any PDF.")
-        exit(1)
+    if BATCH_CONFIGS:
+        all_sections = list(section_stream)
+        if not all_sections:
+            print("No sections were found in any PDF.")
+            exit(1)
+
+        set_encoder_threads(EMBED_THREADS)
+        if LEXICAL_CANDIDATES:
+            # One BM25 index for the collection; each config encodes only its own shortlist
+            lexical_index = build_lexical_index(all_sections)
+            rankings = (rank_sections_hybrid([dict(section) for section in all_sections], persona, job, MODEL_PATH,
+                                             embedding_cache, top_k=10, candidates=LEXICAL_CANDIDATES,
+                                             fusion=HYBRID_FUSION, batch_size=EMBED_BATCH_SIZE, quantize=EMBED_INT8,
+                                             pooling=TOKEN_WINDOWS, lexical_index=lexical_index)
+                        for _, persona, job in configs)
+        else:
+            rankings = rank_sections_for_personas(all_sections, [(persona, job) for _, persona, job in configs],
+                                                  MODEL_PATH, embedding_cache, top_k=10, batch_size=EMBED_BATCH_SIZE,
+                                                  quantize=EMBED_INT8)
+        for (config_path, persona, job), ranked_sections in zip(configs, rankings):
+            output_path = batch_output_path(config_path)
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(make_final_output(pdf_files, persona, job, ranked_sections, top_k=10), f,
+                          indent=2, ensure_ascii=False)
+            print(f"Saved output for {os.path.basename(config_path)} to {output_path}")
+        exit(0)
+
+    if STREAM_SECTIONS:
+        # Rank while documents are still being extracted; only the top sections are kept
+        set_encoder_threads(EMBED_THREADS)
+        ranked_sections = rank_section_stream(section_stream, persona, job, MODEL_PATH, embedding_cache, top_k=10,
+                                              batch_size=EMBED_BATCH_SIZE, quantize=EMBED_INT8)
+        if not ranked_sections:
+            print("No sections were found in any PDF.")
+            exit(1)
+    else:
+        all_sections = list(section_stream)
+        if not all_sections:
+            print("No sections were found in any PDF.")
+            exit(1)
 
-    # Global ranking across all section-chunks from all PDFs
-    ranked_sections = rank_sections_for_persona(all_sections, persona, job, MODEL_PATH)
+        # Global ranking across all section-chunks from all PDFs
+        set_encoder_threads(EMBED_THREADS)
+        if INDEX_DIR:
+            index = build_section_index(all_sections, MODEL_PATH, embedding_cache, EMBED_BATCH_SIZE, EMBED_INT8)
+            if IVF_LISTS:
+                index.build_ivf(IVF_LISTS)
+            index.save(INDEX_DIR)
+            query_emb = embed_texts(load_model(MODEL_PATH, EMBED_INT8), [persona_query(persona, job)])[0]
+            ranked_sections = index.query_sections(query_emb, top_k=10)
+        elif LEXICAL_CANDIDATES:
+            # Encode only the sections sharing the most vocabulary with the persona and job
+            ranked_sections = rank_sections_hybrid(all_sections, persona, job, MODEL_PATH, embedding_cache, top_k=10,
+                                                   candidates=LEXICAL_CANDIDATES, fusion=HYBRID_FUSION,
+                                                   batch_size=EMBED_BATCH_SIZE, quantize=EMBED_INT8,
+                                                   pooling=TOKEN_WINDOWS)
+        elif TOKEN_WINDOWS:
+            ranked_sections = rank_sections_by_windows(all_sections, persona, job, MODEL_PATH, embedding_cache,
+                                                       top_k=10, pooling=TOKEN_WINDOWS, batch_size=EMBED_BATCH_SIZE,
+                                                       quantize=EMBED_INT8)
+        else:
+            ranked_sections = rank_sections_for_persona(all_sections, persona, job, MODEL_PATH, embedding_cache,
+                                                        top_k=10, batch_size=EMBED_BATCH_SIZE, quantize=EMBED_INT8)
     result_json = make_final_output(pdf_files, persona, job, ranked_sections, top_k=10)
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(result_json, f, indent=2, ensure_ascii=False)
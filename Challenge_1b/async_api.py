@@ -0,0 +1,158 @@
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from batch_pipeline import pipeline
+from embeddings import DEFAULT_BATCH_SIZE, EmbeddingCache, embed_texts, load_model, persona_query, section_text
+from pdf_extractor import DocumentPool, metrics
+from vector_index import normalize_rows, top_k_indices
+
+class EncodeBatcher:
+    """Collects texts from concurrent callers and encodes them in one model call.
+
+    The first request in an idle period waits `window` seconds for others to
+    join; everything queued by then (duplicates encoded once) goes to the model
+    together, and each caller gets back its own rows.
+    """
+    def __init__(self, model_path: str, executor: ThreadPoolExecutor, embedding_cache: Optional[EmbeddingCache] = None,
+                 window: float = 0.005, batch_size: int = DEFAULT_BATCH_SIZE, quantize: bool = False):
+        self.model = load_model(model_path, quantize)
+        self.executor = executor
+        self.embedding_cache = embedding_cache
+        self.window = window
+        self.batch_size = batch_size
+        self._queue: List[Tuple[List[str], asyncio.Future]] = []
+        self._drainer: Optional[asyncio.Task] = None
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((texts, future))
+        if self._drainer is None:
+            self._drainer = asyncio.get_running_loop().create_task(self._drain())
+        return await future
+
+    async def _drain(self):
+        try:
+            await asyncio.sleep(self.window)
+            while self._queue:
+                requests, self._queue = self._queue, []
+                unique = {}
+                for texts, _ in requests:
+                    for text in texts:
+                        unique.setdefault(text, len(unique))
+                try:
+                    vectors = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, embed_texts, self.model, list(unique), self.embedding_cache, self.batch_size)
+                except Exception as e:
+                    for _, future in requests:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for texts, future in requests:
+                    if not future.done():
+                        future.set_result(vectors[[unique[text] for text in texts]])
+        finally:
+            self._drainer = None
+
+class AsyncPipeline:
+    """asyncio front end for outline extraction, section chunking and persona ranking.
+
+    PDF work runs in a DocumentPool of worker processes and model work on a
+    single thread, so the event loop only coordinates. Concurrent requests for
+    the same document, whether for its structure or its sections, share one
+    in-flight parse that yields both, and concurrent rankings share encode
+    batches through an EncodeBatcher.
+    """
+    def __init__(self, model_path: str, workers: int = 1, embedding_cache: Optional[EmbeddingCache] = None,
+                 batch_window: float = 0.005, batch_size: int = DEFAULT_BATCH_SIZE, quantize: bool = False,
+                 **extractor_options):
+        self.documents = DocumentPool(max(1, workers), **extractor_options)
+        # One thread owns the model; torch parallelizes inside each encode call
+        self._model_executor = ThreadPoolExecutor(max_workers=1)
+        self.encoder = EncodeBatcher(model_path, self._model_executor, embedding_cache, batch_window, batch_size,
+                                     quantize)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def _coalesced(self, pdf_path: str, start: Callable[[], Awaitable[Any]]) -> Any:
+        """Run start() once for concurrent requests for the same file; later ones await it."""
+        key = os.path.abspath(pdf_path)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(start())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _run_document_task(self, task: Callable, pdf_path: str) -> Any:
+        future = self.documents.submit(task, pdf_path)
+        await asyncio.wait([asyncio.wrap_future(future)])
+        result, error = DocumentPool.result(future)
+        if error is not None:
+            raise RuntimeError(f"{os.path.basename(pdf_path)}: {error}")
+        return result
+
+    async def _document(self, pdf_path: str) -> Tuple[Dict[str, Any], Optional[List[Dict[str, Any]]]]:
+        """(structure with y_pos, sections) of a PDF, from one parse shared by concurrent requests."""
+        return await self._coalesced(pdf_path, lambda: self._run_document_task(pipeline.extract_document, pdf_path))
+
+    async def extract_document_structure(self, pdf_path: str, include_positions: bool = False) -> Dict[str, Any]:
+        """Title and outline of a PDF; with include_positions each entry keeps its y_pos."""
+        structure, _ = await self._document(pdf_path)
+        if include_positions:
+            return structure
+        return {
+            "title": structure["title"],
+            "outline": [{key: value for key, value in entry.items() if key != "y_pos"}
+                        for entry in structure["outline"]]
+        }
+
+    async def extract_section_chunks(self, pdf_path: str) -> List[Dict[str, Any]]:
+        """Section chunks of a PDF under its detected headings (empty without headings)."""
+        _, sections = await self._document(pdf_path)
+        return [dict(section) for section in sections or []]
+
+    async def rank_sections_for_persona(self, pdf_paths: List[str], persona: str, job: str,
+                                        top_k: int = 10) -> List[Dict[str, Any]]:
+        """The top_k sections of the given PDFs for a persona and job, best first.
+
+        PDFs that fail to extract are left out, as in the batch pipeline; each is
+        reported on stderr and counted in the "failed_documents" metric.
+        """
+        document_sections = await asyncio.gather(*(self.extract_section_chunks(pdf_path) for pdf_path in pdf_paths),
+                                                 return_exceptions=True)
+        sections = []
+        for doc_sections in document_sections:
+            if isinstance(doc_sections, Exception):
+                # The error already names the document
+                sys.stderr.write(f"Error processing {doc_sections}\n")
+                metrics.count("failed_documents")
+                continue
+            sections.extend(doc_sections)
+        if not sections:
+            return []
+        vectors = await self.encoder.encode([persona_query(persona, job)] + [section_text(section) for section in sections])
+        sims = normalize_rows(vectors[1:]) @ normalize_rows(vectors[0])
+        ranked = []
+        for i in top_k_indices(sims, top_k):
+            sections[i]['similarity'] = float(sims[i])
+            ranked.append(sections[i])
+        return ranked
+
+    async def rank(self, pdf_paths: List[str], persona: str, job: str, top_k: int = 10) -> Dict[str, Any]:
+        """Rank sections for a persona and build the 1B output document."""
+        ranked = await self.rank_sections_for_persona(pdf_paths, persona, job, top_k)
+        return pipeline.make_final_output(pdf_paths, persona, job, ranked, top_k=top_k)
+
+    def close(self):
+        self._model_executor.shutdown()
+        self.documents.close()
+
+    async def __aenter__(self) -> "AsyncPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,8 @@
+"""The batch pipeline of 1B.py, for modules that reuse its functions.
+
+1B.py is not a valid identifier, so it cannot be imported with an import
+statement; it is imported by name once here and shared as `pipeline`.
+"""
+import importlib
+
+pipeline = importlib.import_module("1B")
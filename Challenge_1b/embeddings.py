@@ -0,0 +1,382 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from pdf_extractor import metrics
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# Seconds spent on deferred startup work in this process (see startup_report)
+startup_timings: Dict[str, float] = {}
+
+# Models loaded in this process, by resolved path and quantization; loading one takes seconds
+_models: Dict[Tuple[str, bool], "SentenceTransformer"] = {}
+
+def load_model(model_path: str, quantize: bool = False) -> "SentenceTransformer":
+    """Load a sentence-transformers model once per process and reuse it afterwards.
+
+    sentence-transformers (and torch) are only imported on the first call, so
+    code paths that never embed do not pay several seconds of import time.
+    With quantize, the model's Linear layers are converted to dynamically
+    quantized int8 for CPU inference: weights are int8, activations are
+    quantized on the fly. This is faster on CPU-only machines but ranks slightly
+    differently (see benchmarks/quantized_ranking.py).
+    """
+    key = (os.path.realpath(model_path), quantize)
+    model = _models.get(key)
+    if model is None:
+        start = time.perf_counter()
+        from sentence_transformers import SentenceTransformer
+        loaded = time.perf_counter()
+        if quantize:
+            import torch
+            model = SentenceTransformer(model_path, device="cpu")
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        else:
+            model = SentenceTransformer(model_path)
+        startup_timings.setdefault("import sentence_transformers", loaded - start)
+        startup_timings[f"load model {model_path}" + (" (int8)" if quantize else "")] = time.perf_counter() - loaded
+        if metrics.enabled:
+            metrics.add_time("model_load", time.perf_counter() - start)
+        _models[key] = model
+    return model
+
+def startup_report() -> str:
+    """One line per deferred startup step with its duration, slowest first."""
+    return "\n".join(f"{seconds:8.3f}s  {step}"
+                     for step, seconds in sorted(startup_timings.items(), key=lambda item: -item[1]))
+
+# Content digests of model files, by (path, size, mtime_ns); weight files are hundreds of MB
+_file_digests: Dict[Tuple[str, int, int], str] = {}
+
+# File in a digest directory recording model file digests across runs
+DIGESTS_FILE = 'model_digests.json'
+
+def _file_digest(path: str, stored: Dict[str, list]) -> str:
+    """sha256 of a file's contents, reused while its size and mtime are unchanged.
+
+    stored maps absolute paths to [size, mtime_ns, digest] saved by earlier runs;
+    a new or changed digest is recorded in it.
+    """
+    stat = os.stat(path)
+    abs_path = os.path.abspath(path)
+    key = (abs_path, stat.st_size, stat.st_mtime_ns)
+    digest = _file_digests.get(key)
+    entry = stored.get(abs_path)
+    if digest is None and isinstance(entry, list) and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        digest = entry[2]
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+    _file_digests[key] = digest
+    stored[abs_path] = [stat.st_size, stat.st_mtime_ns, digest]
+    return digest
+
+def _load_digests(digest_dir: str) -> Dict[str, list]:
+    try:
+        with open(os.path.join(digest_dir, DIGESTS_FILE), 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        return stored if isinstance(stored, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _save_digests(digest_dir: str, stored: Dict[str, list]):
+    """Write the digests atomically; a read-only directory only costs re-hashing next time."""
+    try:
+        os.makedirs(digest_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=digest_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, os.path.join(digest_dir, DIGESTS_FILE))
+    except OSError:
+        pass
+
+def model_identity(model_path: str, quantize: bool = False, digest_dir: Optional[str] = None) -> str:
+    """Short hash identifying a local model directory's contents.
+
+    Covers every file's name and a hash of its contents, so a retrained model
+    never reuses embeddings from another one, even when its weight files keep
+    the same sizes. The int8 model's embeddings differ from fp32 ones, so
+    quantize changes it too. Hashing the weights takes seconds, so with
+    digest_dir (e.g. the embedding cache directory) file digests are saved
+    there and only files whose size or mtime changed are hashed again.
+    """
+    stored = _load_digests(digest_dir) if digest_dir else {}
+    before = dict(stored)
+    hasher = hashlib.sha256()
+    if quantize:
+        hasher.update(b"dynamic-int8:")
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, model_path)
+            hasher.update(f"{rel_path}:{_file_digest(path, stored)}".encode('utf-8'))
+    if digest_dir and stored != before:
+        _save_digests(digest_dir, stored)
+    return hasher.hexdigest()[:16]
+
+def persona_query(persona: str, job: str) -> str:
+    """Query text embedded for a persona and job to be done."""
+    return f"{persona}. {job}"
+
+# Characters of a section chunk embedded as one text and output as its refined_text
+MAX_SECTION_LENGTH = 4000
+
+def section_text(section: Dict[str, str], max_length: int = MAX_SECTION_LENGTH) -> str:
+    """A section's chunk cut to max_length characters, with '...' marking the cut.
+
+    Chunks keep a section's whole body (token windows read all of it); this is
+    the text embedded as a single input and shown in the output.
+    """
+    chunk = section['chunk']
+    return chunk[:max_length] + '...' if len(chunk) > max_length else chunk
+
+def text_key(text: str) -> str:
+    """Cache key for a piece of text to embed."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+class EmbeddingCache:
+    """Persistent store of text embeddings for one model, keyed by text hash.
+
+    Each flush writes the new vectors as a separate .npz shard (atomically), so
+    earlier shards are never rewritten; once there are too many shards they are
+    merged into one on load.
+    """
+    def __init__(self, cache_dir: str, model_id: str, max_shards: int = 16):
+        self.model_id = model_id
+        self.cache_dir = os.path.join(cache_dir, model_id)
+        self.max_shards = max_shards
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._pending: Dict[str, np.ndarray] = {}
+        self._load()
+
+    def _shard_paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.cache_dir, 'shard-*.npz')))
+
+    def _load(self):
+        shard_paths = self._shard_paths()
+        for path in shard_paths:
+            try:
+                with np.load(path) as shard:
+                    for key, vector in zip(shard['keys'], shard['vectors']):
+                        self._vectors[str(key)] = vector
+            except (OSError, ValueError, KeyError):
+                continue  # partially written or foreign file
+        if len(shard_paths) > self.max_shards:
+            self._compact(shard_paths)
+
+    def _write_shard(self, vectors: Dict[str, np.ndarray]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, keys=np.array(list(vectors)), vectors=np.stack(list(vectors.values())))
+            os.replace(tmp_path, os.path.join(self.cache_dir, f"shard-{uuid.uuid4().hex}.npz"))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _compact(self, shard_paths: List[str]):
+        """Replace the given shards with a single shard holding everything loaded."""
+        if not self._vectors:
+            return
+        self._write_shard(self._vectors)
+        for path in shard_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._vectors
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        return self._vectors.get(key)
+
+    def put(self, key: str, vector: np.ndarray):
+        vector = np.asarray(vector, dtype=np.float32)
+        self._vectors[key] = vector
+        self._pending[key] = vector
+
+    def flush(self):
+        """Persist vectors added since the last flush."""
+        if self._pending:
+            self._write_shard(self._pending)
+            self._pending = {}
+
+# Texts per model.encode call; batches are formed from texts of similar length
+DEFAULT_BATCH_SIZE = 32
+
+def set_encoder_threads(num_threads: int):
+    """Pin torch's intra-op thread pool, e.g. to the container's CPU quota.
+    
+    Without this torch sizes the pool from the host's core count, which
+    oversubscribes CPU-limited containers and PDF worker processes.
+    """
+    start = time.perf_counter()
+    import torch
+    startup_timings.setdefault("import torch", time.perf_counter() - start)
+    torch.set_num_threads(max(1, num_threads))
+
+def iter_encoded_batches(model: "SentenceTransformer", texts: List[str],
+                         batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Tuple[List[int], np.ndarray]]:
+    """Yield (positions, vectors) for texts encoded in batches of similar length.
+
+    Ordering by length keeps padding inside each batch small, and only one
+    batch is tokenized and run through the model at a time. With metrics
+    enabled, batches are tokenized once more to count the tokens encoded.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for start in range(0, len(order), batch_size):
+        positions = order[start:start + batch_size]
+        batch = [texts[i] for i in positions]
+        if metrics.enabled:
+            metrics.count("texts_encoded", len(batch))
+            token_ids = model.tokenizer(batch, truncation=True, max_length=model.max_seq_length)["input_ids"]
+            metrics.count("tokens_encoded", sum(len(ids) for ids in token_ids))
+        with metrics.stage("encode"):
+            vectors = model.encode(batch, batch_size=len(positions), convert_to_numpy=True, show_progress_bar=False)
+        yield positions, vectors.astype(np.float32, copy=False)
+
+def encode_texts(model: "SentenceTransformer", texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """Encode texts batch by batch into a float32 matrix in input order."""
+    embeddings = None
+    for positions, vectors in iter_encoded_batches(model, texts, batch_size):
+        if embeddings is None:
+            embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        embeddings[positions] = vectors
+    if embeddings is None:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    return embeddings
+
+def embed_texts(model: "SentenceTransformer", texts: List[str], cache: Optional[EmbeddingCache] = None,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """Encode texts into a float32 matrix, encoding only texts missing from the cache."""
+    if cache is None:
+        return encode_texts(model, texts, batch_size)
+
+    keys = [text_key(text) for text in texts]
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cache and key not in missing:
+            missing[key] = text
+    if missing:
+        missing_keys = list(missing)
+        for positions, vectors in iter_encoded_batches(model, list(missing.values()), batch_size):
+            for position, vector in zip(positions, vectors):
+                cache.put(missing_keys[position], vector)
+        cache.flush()
+
+    if not keys:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    return np.stack([cache.get(key) for key in keys])
+
+# Tokens shared by consecutive windows of a long text, so no sentence is only seen cut in half
+DEFAULT_WINDOW_OVERLAP = 32
+
+def tokenize_texts(model: "SentenceTransformer", texts: List[str]) -> List[List[int]]:
+    """Token ids of each whole text, without special tokens or truncation."""
+    return model.tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]
+
+def _special_tokens(tokenizer) -> Tuple[List[int], List[int]]:
+    """The ids the tokenizer puts before and after a single text (e.g. [CLS] and [SEP])."""
+    plain = tokenizer("a", add_special_tokens=False)["input_ids"]
+    full = tokenizer("a")["input_ids"]
+    for start in range(len(full) - len(plain) + 1):
+        if full[start:start + len(plain)] == plain:
+            return full[:start], full[start + len(plain):]
+    return [], []
+
+def window_size(model: "SentenceTransformer") -> int:
+    """Text tokens that fit in one model input next to the special tokens."""
+    prefix, suffix = _special_tokens(model.tokenizer)
+    return model.max_seq_length - len(prefix) - len(suffix)
+
+def token_windows(token_ids: List[int], size: int, overlap: int = DEFAULT_WINDOW_OVERLAP) -> List[List[int]]:
+    """Split token ids into windows of at most size tokens, consecutive ones sharing overlap tokens.
+
+    Every text gets at least one window, an empty one included.
+    """
+    stride = max(1, size - overlap)
+    windows = [token_ids[:size]]
+    start = 0
+    while start + size < len(token_ids):
+        start += stride
+        windows.append(token_ids[start:start + size])
+    return windows
+
+def window_key(token_ids: List[int]) -> str:
+    """Cache key for a token window, distinct from any text_key."""
+    return "tokens-" + hashlib.sha256(np.asarray(token_ids, dtype=np.int64).tobytes()).hexdigest()[:25]
+
+def encode_token_windows(model: "SentenceTransformer", windows: List[List[int]],
+                         batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """Encode already tokenized windows into a float32 matrix in input order.
+
+    The ids go to the model as they are, wrapped in its special tokens, so
+    texts are never tokenized a second time. Batches are formed from windows of
+    similar length, as in iter_encoded_batches.
+    """
+    import torch
+    tokenizer = model.tokenizer
+    prefix, suffix = _special_tokens(tokenizer)
+    embeddings = None
+    order = sorted(range(len(windows)), key=lambda i: len(windows[i]))
+    for start in range(0, len(order), batch_size):
+        positions = order[start:start + batch_size]
+        input_ids = [prefix + windows[i] + suffix for i in positions]
+        if metrics.enabled:
+            metrics.count("texts_encoded", len(input_ids))
+            metrics.count("tokens_encoded", sum(len(ids) for ids in input_ids))
+        features = tokenizer.pad({"input_ids": input_ids}, return_tensors="pt")
+        with metrics.stage("encode"), torch.no_grad():
+            features = {name: tensor.to(model.device) for name, tensor in features.items()}
+            vectors = model(features)["sentence_embedding"].float().cpu().numpy()
+        if embeddings is None:
+            embeddings = np.empty((len(windows), vectors.shape[1]), dtype=np.float32)
+        embeddings[positions] = vectors
+    if embeddings is None:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    return embeddings
+
+def embed_token_windows(model: "SentenceTransformer", windows: List[List[int]], cache: Optional[EmbeddingCache] = None,
+                        batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """Encode token windows into a float32 matrix, encoding only windows missing from the cache."""
+    if cache is None:
+        return encode_token_windows(model, windows, batch_size)
+
+    keys = [window_key(window) for window in windows]
+    missing = {}
+    for key, window in zip(keys, windows):
+        if key not in cache and key not in missing:
+            missing[key] = window
+    if missing:
+        for key, vector in zip(missing, encode_token_windows(model, list(missing.values()), batch_size)):
+            cache.put(key, vector)
+        cache.flush()
+
+    if not keys:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    return np.stack([cache.get(key) for key in keys])
+
+def cosine_similarities(query_emb: np.ndarray, section_embs: np.ndarray) -> np.ndarray:
+    """Cosine similarity of one query vector against each row of a matrix."""
+    query_norm = query_emb / max(np.linalg.norm(query_emb), 1e-12)
+    row_norms = np.maximum(np.linalg.norm(section_embs, axis=1), 1e-12)
+    return (section_embs @ query_norm) / row_norms
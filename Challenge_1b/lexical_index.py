@@ -0,0 +1,81 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from vector_index import top_k_indices
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Words too common to tell sections apart; dropping them keeps posting lists short
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or that the their this to was were
+will with you your i we our they them he she his her not no do does can all any more most other some such
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords, with a plural "s" stripped ("trips" -> "trip")."""
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+class BM25Index:
+    """Okapi BM25 over a list of texts, as an inverted index of NumPy posting arrays.
+
+    Each term maps to the ids of the texts containing it and its count in each,
+    so scoring a query only touches the postings of its own terms.
+    """
+    def __init__(self, postings: Dict[str, Tuple[np.ndarray, np.ndarray]], doc_lengths: np.ndarray,
+                 k1: float = 1.2, b: float = 0.75):
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # Per-text length normalization, the k1 * (1 - b + b * dl / avgdl) term of BM25
+        self._length_norm = (k1 * (1 - b + b * doc_lengths / max(average_length, 1e-12))).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        doc_ids = defaultdict(list)
+        counts = defaultdict(list)
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, count in Counter(tokens).items():
+                doc_ids[term].append(doc_id)
+                counts[term].append(count)
+        postings = {term: (np.array(ids, dtype=np.int32), np.array(counts[term], dtype=np.float32))
+                    for term, ids in doc_ids.items()}
+        return cls(postings, doc_lengths, k1, b)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def idf(self, term: str) -> float:
+        postings = self.postings.get(term)
+        df = len(postings[0]) if postings is not None else 0
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every indexed text for a query; 0 for texts sharing no term with it."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term, query_count in Counter(tokenize(query)).items():
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            ids, tf = postings
+            scores[ids] += query_count * self.idf(term) * tf * (self.k1 + 1) / (tf + self._length_norm[ids])
+        return scores
+
+    def top_n(self, query: str, n: int) -> np.ndarray:
+        """Ids of the n best matching texts, best first (ties in text order)."""
+        return top_k_indices(self.scores(query), n)
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from embeddings import section_text, text_key
+from pdf_extractor import file_sha256
+
+MANIFEST_VERSION = 1
+
+class CollectionManifest:
+    """Record of what has been extracted from each PDF of a collection.
+
+    Every document entry keeps the file's mtime, size and SHA-256, its section
+    chunks and the embedding ids (text keys) of those chunks. A re-run compares
+    the folder against it so only added or modified PDFs are processed again;
+    entries for removed PDFs are dropped. A different extractor config version
+    invalidates every entry.
+    """
+    def __init__(self, path: str, config_version: str):
+        self.path = path
+        self.config_version = config_version
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") == MANIFEST_VERSION and data.get("config_version") == self.config_version:
+            self.documents = data.get("documents", {})
+
+    @staticmethod
+    def _name(pdf_path: str) -> str:
+        return os.path.basename(pdf_path)
+
+    def _is_current(self, pdf_path: str, entry: Dict[str, Any]) -> bool:
+        """Whether a recorded entry still describes the file; touched but identical files are kept."""
+        stat = os.stat(pdf_path)
+        if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return True
+        if entry["size"] != stat.st_size or entry["sha256"] != file_sha256(pdf_path):
+            return False
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def refresh(self, pdf_files: List[str]) -> Tuple[List[str], List[str]]:
+        """Drop entries for PDFs no longer present and return (stale paths, removed names).
+
+        Stale paths are the added or modified PDFs that need extracting, in input order.
+        Entries of modified PDFs are dropped as well, so a PDF whose re-extraction
+        fails has no sections rather than those of its previous version.
+        """
+        names = {self._name(pdf_path) for pdf_path in pdf_files}
+        removed = [name for name in self.documents if name not in names]
+        for name in removed:
+            del self.documents[name]
+        stale = []
+        for pdf_path in pdf_files:
+            name = self._name(pdf_path)
+            entry = self.documents.get(name)
+            if entry is None or not self._is_current(pdf_path, entry):
+                self.documents.pop(name, None)
+                stale.append(pdf_path)
+        return stale, removed
+
+    def record(self, pdf_path: str, sections: Optional[List[Dict[str, Any]]]):
+        """Store a PDF's extracted sections (None when it has no headings)."""
+        stat = os.stat(pdf_path)
+        sections = sections or []
+        self.documents[self._name(pdf_path)] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": file_sha256(pdf_path),
+            "sections": sections,
+            "embedding_ids": [text_key(section_text(section)) for section in sections],
+        }
+
+    def sections(self, pdf_files: List[str]) -> List[Dict[str, Any]]:
+        """Recorded sections of the given PDFs, in input order."""
+        sections = []
+        for pdf_path in pdf_files:
+            entry = self.documents.get(self._name(pdf_path))
+            if entry is not None:
+                sections.extend(dict(section) for section in entry["sections"])
+        return sections
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        data = {"version": MANIFEST_VERSION, "config_version": self.config_version, "documents": self.documents}
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
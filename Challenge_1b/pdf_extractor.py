@@ -1,37 +1,700 @@
+import time
+_import_start = time.perf_counter()
 import fitz  # PyMuPDF
+import numpy as np
+import hashlib
 import json
 import os
 import re
-from collections import defaultdict
-from typing import List, Dict, Any, Tuple
+import sys
+import tempfile
+import threading
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import List, Dict, Any, Tuple, Union, Callable, Optional, Iterator, NamedTuple, BinaryIO
+# PyMuPDF and NumPy are all this module loads; it never imports torch
+IMPORT_SECONDS = time.perf_counter() - _import_start
 
-class PDFStructureExtractor:
+class SpanRecord(NamedTuple):
+    """The parts of a PyMuPDF text span the extractor and chunker use."""
+    text: str
+    size: float
+    font: str
+    flags: int
+    x: float
+
+class LineRecord(NamedTuple):
+    """A text line: its block index on the page, rounded top y, and spans."""
+    block: int
+    y: float
+    spans: Tuple[SpanRecord, ...]
+
+# get_text("dict") defaults minus TEXT_PRESERVE_IMAGES: text output is identical,
+# but MuPDF no longer decodes and copies out every image on the page
+FAST_TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+    
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+    
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+class _NoStage:
+    __slots__ = ()
+    
+    def __enter__(self):
+        pass
+    
+    def __exit__(self, *exc_info):
+        pass
+
+_NO_STAGE = _NoStage()
+
+class Metrics:
+    """Per-stage wall time and event counters of one process.
+    
+    `with metrics.stage("get_text"):` adds the block's duration to that stage and
+    metrics.count("pages") bumps a counter. Disabled, both are no-ops costing a
+    method call, so call sites stay in place; work done only to compute a count
+    should be guarded by `if metrics.enabled`. Records are plain dicts, so
+    per-document records from worker processes can be merged into run totals.
+    """
+    def __init__(self, enabled: bool = False, log_path: Optional[str] = None, prometheus_path: Optional[str] = None):
+        self.enabled = enabled
+        # JSON lines go to this file (appended), or to stderr when unset
+        self.log_path = log_path
+        # Prometheus text exposition of the run totals, written by report()
+        self.prometheus_path = prometheus_path
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counts = defaultdict(int)
+    
+    def stage(self, name: str):
+        return _Stage(self, name) if self.enabled else _NO_STAGE
+    
+    def add_time(self, name: str, seconds: float):
+        self.seconds[name] += seconds
+        self.calls[name] += 1
+    
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counts[name] += n
+    
+    def timed(self, name: str, func: Callable) -> Callable:
+        """Wrap func so each call is timed as a stage; func itself when disabled."""
+        if not self.enabled:
+            return func
+        def timed_func(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_time(name, time.perf_counter() - start)
+        return timed_func
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {"seconds": dict(self.seconds), "calls": dict(self.calls), "counts": dict(self.counts)}
+    
+    def since(self, snapshot: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        """What was recorded after an earlier snapshot, e.g. for one document."""
+        record = {}
+        for kind, current in self.snapshot().items():
+            earlier = snapshot[kind]
+            record[kind] = {name: value - earlier.get(name, 0) for name, value in current.items()
+                            if value != earlier.get(name, 0)}
+        return record
+    
+    def merge(self, record: Dict[str, Dict[str, float]]):
+        """Add a record (e.g. a worker's per-document record) to this process's totals."""
+        for name, seconds in record["seconds"].items():
+            self.seconds[name] += seconds
+        for name, calls in record["calls"].items():
+            self.calls[name] += calls
+        for name, n in record["counts"].items():
+            self.counts[name] += n
+    
+    def log(self, record: Dict[str, Dict[str, float]], **labels):
+        """Write a record as one JSON line, with labels such as scope and document."""
+        entry = dict(labels)
+        entry["seconds"] = {name: round(seconds, 6) for name, seconds in record["seconds"].items()}
+        entry["calls"] = record["calls"]
+        entry["counts"] = record["counts"]
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        if self.log_path:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        else:
+            sys.stderr.write(line)
+    
+    def prometheus(self, prefix: str = "pdf_pipeline") -> str:
+        """The totals in Prometheus text exposition format."""
+        lines = [f"# HELP {prefix}_stage_seconds_total Wall time spent in each pipeline stage.",
+                 f"# TYPE {prefix}_stage_seconds_total counter"]
+        lines += [f'{prefix}_stage_seconds_total{{stage="{name}"}} {seconds:.6f}'
+                  for name, seconds in sorted(self.seconds.items())]
+        lines += [f"# HELP {prefix}_stage_calls_total Times each pipeline stage ran.",
+                  f"# TYPE {prefix}_stage_calls_total counter"]
+        lines += [f'{prefix}_stage_calls_total{{stage="{name}"}} {calls}' for name, calls in sorted(self.calls.items())]
+        for name, n in sorted(self.counts.items()):
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {n}"]
+        return "\n".join(lines) + "\n"
+    
+    def report(self, **labels):
+        """Log the run totals and write the Prometheus dump if a path is set; no-op when disabled."""
+        if not self.enabled:
+            return
+        self.log(self.snapshot(), scope="run", **labels)
+        if self.prometheus_path:
+            with open(self.prometheus_path, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus())
+
+# Stage timings and counters of this process, enabled with PIPELINE_METRICS=1.
+# Pool workers inherit the setting and send each document's record back.
+metrics = Metrics(enabled=os.environ.get("PIPELINE_METRICS") == "1",
+                  log_path=os.environ.get("PIPELINE_METRICS_LOG"),
+                  prometheus_path=os.environ.get("PIPELINE_METRICS_PROM"))
+
+class ProfileCapture:
+    """Profile a block with cProfile or tracemalloc (mode "cprofile" / "tracemalloc").
+    
+    On exit the top entries are printed to stderr; cProfile stats are also
+    saved to output_path for pstats or snakeviz. Only the current process is
+    profiled, so run with one worker to include extraction. An empty mode
+    profiles nothing.
+    """
+    def __init__(self, mode: Optional[str], output_path: Optional[str] = None, top: int = 25):
+        if mode not in (None, "", "cprofile", "tracemalloc"):
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.output_path = output_path
+        self.top = top
+        self._profiler = None
+    
+    def start(self):
+        if self.mode == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.mode == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start(10)
+    
+    def stop(self):
+        if self.mode == "cprofile" and self._profiler is not None:
+            import pstats
+            self._profiler.disable()
+            if self.output_path:
+                self._profiler.dump_stats(self.output_path)
+            pstats.Stats(self._profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(self.top)
+            self._profiler = None
+        elif self.mode == "tracemalloc":
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                return
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            sys.stderr.write(f"tracemalloc: {current / 2**20:.1f} MB allocated, peak {peak / 2**20:.1f} MB\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                sys.stderr.write(f"  {stat}\n")
+    
+    def __enter__(self) -> "ProfileCapture":
+        self.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+
+# A PDF given as a path, its bytes, or a binary stream (see PDFInput)
+PDFSource = Union[str, bytes, BinaryIO]
+
+# Share of MuPDF's global resource store (fonts, decoded images) freed between
+# pages, so it stays near one page's working set instead of growing to its limit
+STORE_TRIM_PERCENT = 50
+
+# MuPDF keeps every object it has parsed until the document is closed, so a
+# document is reopened after this many pages to keep memory flat on huge files
+RESIDENT_PAGE_WINDOW = 64
+
+def source_name(source: PDFSource) -> str:
+    """A printable name for a PDF source."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, 'name', None) or "<stream>"
+
+class PDFInput:
+    """A PDF opened for page-at-a-time reading with bounded memory.
+    
+    Paths are opened directly and MuPDF reads the file on demand; bytes are
+    opened in place; other streams are spooled to a temporary file in chunks,
+    since MuPDF needs random access. Use as a context manager.
+    """
+    def __init__(self, source: PDFSource, page_window: int = RESIDENT_PAGE_WINDOW):
+        self.page_window = page_window
+        self._tmp_path = None
+        if isinstance(source, (str, os.PathLike, bytes, bytearray, memoryview)):
+            self._source = source
+        else:
+            self._source = self._tmp_path = self._spool(source)
+        try:
+            self.doc = self._open()
+        except BaseException:
+            self._remove_spool()
+            raise
+        self.metadata = self.doc.metadata or {}
+    
+    @staticmethod
+    def _spool(stream: BinaryIO) -> str:
+        fd, tmp_path = tempfile.mkstemp(suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+    
+    def _open(self) -> fitz.Document:
+        with metrics.stage("open"):
+            if isinstance(self._source, (bytes, bytearray, memoryview)):
+                return fitz.open(stream=self._source, filetype="pdf")
+            return fitz.open(self._source)
+    
+    def _remove_spool(self):
+        if self._tmp_path is not None:
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+            self._tmp_path = None
+    
+    def __len__(self) -> int:
+        return len(self.doc)
+    
+    def pages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, fitz.Page]]:
+        """Yield (page number, page) one at a time.
+        
+        Callers should drop each page before asking for the next. MuPDF's store
+        is trimmed between pages and the document is reopened every page_window
+        pages, so resident memory does not grow with the page count.
+        """
+        stop = len(self.doc) if stop is None else stop
+        for count, page_num in enumerate(range(start, stop)):
+            if self.page_window and count and count % self.page_window == 0:
+                self.doc.close()
+                self.doc = self._open()
+            yield page_num, self.doc.load_page(page_num)
+            fitz.TOOLS.store_shrink(STORE_TRIM_PERCENT)
+    
+    def close(self):
+        self.doc.close()
+        self._remove_spool()
+    
+    def __enter__(self) -> "PDFInput":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _page_line_records(page, fast_layout: bool = True) -> List[LineRecord]:
+    """Lay out a page and convert its text lines straight into compact records."""
+    with metrics.stage("get_text"):
+        if fast_layout:
+            text_dict = page.get_text("dict", flags=FAST_TEXT_FLAGS)
+        else:
+            text_dict = page.get_text("dict")
+    lines = []
+    for block_num, block in enumerate(text_dict.get("blocks", [])):
+        if "lines" not in block:
+            continue  # image block
+        for line in block["lines"]:
+            lines.append(LineRecord(block_num, round(line["bbox"][1], 1), tuple(
+                SpanRecord(span["text"], span["size"], span["font"], span["flags"], span["bbox"][0])
+                for span in line["spans"]
+            )))
+    if metrics.enabled:
+        metrics.count("pages")
+        metrics.count("spans", sum(len(line.spans) for line in lines))
+    return lines
+
+class PageLayout(NamedTuple):
+    """One laid-out page: its lines, heading candidates and line keys (see iter_pages)."""
+    page_num: int
+    lines: List[LineRecord]
+    elements: List[Dict[str, Any]]
+    line_keys: List[int]
+
+def _block_texts(lines: List[LineRecord]) -> List[str]:
+    """Join a page's lines into block texts, matching page.get_text("blocks") text content."""
+    blocks = defaultdict(list)
+    for line in lines:
+        blocks[line.block].append("".join(span.text for span in line.spans))
+    return ["\n".join(block_lines) for block_lines in blocks.values()]
+
+class SpanTable:
+    """One page's non-blank spans as parallel columns, grouped into visual lines.
+    
+    Spans of all lines sharing a y position form one visual line; the per-line
+    reductions (bold span count, span count, max size) run as NumPy segment
+    reductions instead of per-span dicts.
+    """
+    __slots__ = ("texts", "y", "x", "size", "bold")
+    
+    def __init__(self, lines: List[LineRecord], is_bold: Callable[[SpanRecord], bool]):
+        texts, ys, xs, sizes, bold = [], [], [], [], []
+        bold_by_font = {}
+        for line in lines:
+            for span in line.spans:
+                if not span.text.strip():
+                    continue
+                font_key = (span.font, span.flags)
+                span_bold = bold_by_font.get(font_key)
+                if span_bold is None:
+                    span_bold = bold_by_font[font_key] = is_bold(span)
+                texts.append(span.text)
+                ys.append(line.y)
+                xs.append(span.x)
+                sizes.append(span.size)
+                bold.append(span_bold)
+        self.texts = texts
+        self.y = np.array(ys, dtype=np.float64)
+        self.x = np.array(xs, dtype=np.float64)
+        self.size = np.array(sizes, dtype=np.float64)
+        self.bold = np.array(bold, dtype=bool)
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+    
+    def line_groups(self) -> Iterator[Tuple[float, str, int, int, float]]:
+        """Yield (y, text, bold span count, span count, max size) per line, top to bottom.
+        
+        Spans within a line are joined left to right; equal x keeps document order.
+        """
+        if not self.texts:
+            return
+        order = np.lexsort((self.x, self.y))  # stable: by y, then x
+        ys = self.y[order]
+        starts = np.flatnonzero(np.concatenate(([True], ys[1:] != ys[:-1])))
+        ends = np.append(starts[1:], len(order))
+        bold_counts = np.add.reduceat(self.bold[order].astype(np.int64), starts)
+        max_sizes = np.maximum.reduceat(self.size[order], starts)
+        order = order.tolist()
+        for start, end, bold_count, max_size in zip(starts.tolist(), ends.tolist(),
+                                                    bold_counts.tolist(), max_sizes.tolist()):
+            text = "".join([self.texts[i] for i in order[start:end]])
+            yield ys[start].item(), text, bold_count, end - start, max_size
+
+class ParsedDocument:
+    """A PDF opened once, with each page's text layout extracted a single time.
+    
+    Pages are stored as LineRecord lists. fast_layout skips image extraction,
+    which does not change any text; pass False to get the full get_text("dict").
+    """
+    def __init__(self, pdf_path: PDFSource, fast_layout: bool = True):
+        self.pdf_path = source_name(pdf_path)
+        self.pages = []
+        # Per-page heading candidates and line keys, filled in when pages were parsed in parallel
+        self.page_elements = None
+        self.page_line_keys = None
+        
+        with PDFInput(pdf_path) as pdf:
+            self.metadata = pdf.metadata
+            for _, page in pdf.pages():
+                self.pages.append(_page_line_records(page, fast_layout))
+                del page
+    
+    @classmethod
+    def from_pages(cls, pdf_path: str, metadata: Dict[str, Any], pages: List[List[LineRecord]],
+                   page_elements: Optional[List[List[Dict[str, Any]]]] = None,
+                   page_line_keys: Optional[List[List[int]]] = None) -> "ParsedDocument":
+        """Build a parsed document from page layouts extracted elsewhere (e.g. in workers)."""
+        doc = cls.__new__(cls)
+        doc.pdf_path = pdf_path
+        doc.metadata = metadata
+        doc.pages = pages
+        doc.page_elements = page_elements
+        doc.page_line_keys = page_line_keys
+        return doc
+    
+    def __len__(self) -> int:
+        return len(self.pages)
+    
+    def page_lines(self, page_num: int) -> List[LineRecord]:
+        """Return the text lines of a 0-based page in reading (block) order."""
+        return self.pages[page_num]
+    
+    def block_texts(self, page_num: int) -> List[str]:
+        """Return block texts of a page, matching page.get_text("blocks") text content."""
+        return _block_texts(self.pages[page_num])
+
+# Bump whenever extraction logic changes in a way that alters cached results
+EXTRACTOR_VERSION = "2"
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file's contents, read in 1 MB blocks."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+class ExtractionCache:
+    """On-disk cache of per-document extraction results, keyed by file content.
+    
+    Entries are JSON files named after a SHA-256 of the PDF bytes plus the
+    extractor's config version, so edited files or changed settings miss.
+    Writes go through a temp file and an atomic rename, which keeps concurrent
+    writers (e.g. pool workers) safe. Hits refresh an entry's mtime, and the
+    least recently used entries are evicted once max_bytes is exceeded.
+    Temp files left behind by killed writers are removed once they are older
+    than STALE_TMP_SECONDS.
+    """
+    STALE_TMP_SECONDS = 3600
+    
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        # Content hashes by (path, mtime, size), so a file is hashed once per process
+        self._hashes = {}
+        self._approx_bytes = None
+    
+    def key(self, pdf_path: str, config_version: str) -> str:
+        """Return the cache key for a PDF's current contents under a given config."""
+        stat = os.stat(pdf_path)
+        memo_key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+        digest = self._hashes.get(memo_key)
+        if digest is None:
+            digest = self._hashes[memo_key] = file_sha256(pdf_path)
+        return f"{digest[:40]}-{config_version}"
+    
+    def _entry_path(self, key: str, kind: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{kind}.json")
+    
+    def get(self, key: str, kind: str) -> Optional[Dict[str, Any]]:
+        """Return a cached entry, or None on a miss (or an unreadable entry)."""
+        path = self._entry_path(key, kind)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:  # evicted meanwhile, or a read-only cache; the value is still good
+            pass
+        return value
+    
+    def put(self, key: str, kind: str, value: Dict[str, Any]):
+        """Atomically store an entry, evicting old entries if over the size limit."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self._entry_path(key, kind))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        if self._approx_bytes is None:
+            self._approx_bytes = self._scan()[1]
+        else:
+            self._approx_bytes += size
+        if self._approx_bytes > self.max_bytes:
+            self._evict()
+    
+    def _scan(self) -> Tuple[List[Tuple[float, int, str]], int]:
+        """List (mtime, size, path) of all entries and their total size, removing stale temp files."""
+        entries = []
+        stale_before = time.time() - self.STALE_TMP_SECONDS
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(('.json', '.tmp')):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith('.tmp'):
+                    # a writer still in progress has touched its temp file recently
+                    if stat.st_mtime < stale_before:
+                        os.remove(path)
+                    continue
+            except FileNotFoundError:  # evicted by another writer
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries, sum(size for _, size, _ in entries)
+    
+    def _evict(self):
+        """Remove least recently used entries until the cache is under 90% of its limit."""
+        entries, total = self._scan()
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._approx_bytes = total
+
+def _parse_page_range(extractor: "PDFStructureExtractor", pdf_path: str, start: int, stop: int):
+    """Lay out pages [start, stop) and find their heading candidates and line keys; runs in a worker process.
+    
+    Also returns the worker's metrics record for the range (None when disabled).
+    """
+    before = metrics.snapshot() if metrics.enabled else None
+    with PDFInput(pdf_path) as pdf:
+        pages = [_page_line_records(page, extractor.fast_layout) for _, page in pdf.pages(start, stop)]
+    results = [extractor._extract_page_elements(start + i, lines) for i, lines in enumerate(pages)]
+    record = metrics.since(before) if before is not None else None
+    return pages, [elements for elements, _ in results], [line_keys for _, line_keys in results], record
+
+_DIGITS = re.compile(r'\d+')
+_NO_LETTERS = re.compile(r'^[^a-zA-Z]*$')
+
+class _ContainmentIndex:
+    """Kept heading texts, indexed by 4-character grams for substring checks.
+    
+    overlaps(text) answers "is text inside a kept text, or a kept text inside
+    text?" without scanning every kept text. Every kept text is at least
+    GRAM characters long, so any kept text containing text also contains each of
+    text's grams, and any kept text inside text starts at one of text's grams.
+    """
+    GRAM = 4
+    
     def __init__(self):
+        self.texts = []
+        # gram -> ids of texts containing it; lists of shared ints, since sets cost
+        # ~10x more per id and grams recur across thousands of headings
+        self.by_gram = defaultdict(list)
+        self.by_prefix = defaultdict(lambda: defaultdict(set))  # gram -> length -> texts starting with it
+    
+    def add(self, text: str):
+        text_id = len(self.texts)
+        self.texts.append(text)
+        for gram in dict.fromkeys(text[i:i + self.GRAM] for i in range(len(text) - self.GRAM + 1)):
+            self.by_gram[gram].append(text_id)
+        self.by_prefix[text[:self.GRAM]][len(text)].add(text)
+    
+    def overlaps(self, text: str) -> bool:
+        # text inside a kept text: only texts sharing text's rarest gram can match
+        if len(text) >= self.GRAM:
+            candidates = min((self.by_gram.get(text[i:i + self.GRAM], ()) for i in range(len(text) - self.GRAM + 1)),
+                             key=len)
+            for text_id in candidates:
+                if text in self.texts[text_id]:
+                    return True
+        else:
+            if any(text in seen for seen in self.texts):
+                return True
+        # a kept text inside text
+        for i in range(len(text) - self.GRAM + 1):
+            by_length = self.by_prefix.get(text[i:i + self.GRAM])
+            if not by_length:
+                continue
+            for length, texts in by_length.items():
+                if i + length <= len(text) and text[i:i + length] in texts:
+                    return True
+        return False
+
+class PDFStructureExtractor:
+    def __init__(self, page_workers: int = 1, cache: Optional[ExtractionCache] = None, fast_layout: bool = True):
+        # Processes used to split a single document's pages (1 parses serially)
+        self.page_workers = page_workers
+        # Optional persistent cache of extraction results
+        self.cache = cache
+        # Text-only page layout (see FAST_TEXT_FLAGS); False requests the full dict
+        self.fast_layout = fast_layout
+        # Smallest page range worth handing to a separate process
+        self.min_pages_per_worker = 8
         self.heading_labels = ["H1", "H2", "H3", "H4", "H5", "H6"]
-        # Common header/footer patterns to exclude
+        # Common header/footer patterns to exclude; document-specific running
+        # headers and footers are learned per document (see _repeating_line_keys)
         self.exclude_patterns = [
-            r'^RFP:\s*To Develop.*Business Plan.*$',
-            r'^March\s+\d{4}$',
             r'^\d+$',  # Just page numbers
             r'^Page\s+\d+.*$',
             r'^\s*$'  # Empty strings
         ]
+        self._exclude_regex = None
+        self._compile_exclude_patterns()
+        # Running headers/footers: lines recurring at the same height on at least
+        # this many pages and this share of all pages are dropped
+        self.repeat_min_pages = 3
+        self.repeat_page_ratio = 0.5
+    
+    def _compile_exclude_patterns(self) -> re.Pattern:
+        """Combine exclude_patterns into a single regex, recompiling if the list was changed."""
+        patterns = tuple(self.exclude_patterns)
+        if self._exclude_regex is None or self._exclude_regex[0] != patterns:
+            combined = "|".join(f"(?:{pattern})" for pattern in patterns)
+            self._exclude_regex = (patterns, re.compile(combined, re.IGNORECASE))
+        return self._exclude_regex[1]
+    
+    def config_version(self) -> str:
+        """Short hash of the settings that affect extraction output, for cache keys."""
+        settings = json.dumps([EXTRACTOR_VERSION, self.heading_labels, self.exclude_patterns,
+                               self.repeat_min_pages, self.repeat_page_ratio])
+        return hashlib.sha256(settings.encode('utf-8')).hexdigest()[:12]
+    
+    def cache_key(self, pdf_path: Union[str, ParsedDocument]) -> Optional[str]:
+        """Return the cache key for a document, or None when caching is disabled."""
+        if self.cache is None:
+            return None
+        if isinstance(pdf_path, ParsedDocument):
+            pdf_path = pdf_path.pdf_path
+        if not isinstance(pdf_path, str) or not os.path.isfile(pdf_path):
+            return None  # streams have no file to hash
+        return self.cache.key(pdf_path, self.config_version())
     
     def _should_exclude_text(self, text: str) -> bool:
         """Check if text should be excluded (headers, footers, page numbers)."""
         text = text.strip()
         if not text:
             return True
-            
-        for pattern in self.exclude_patterns:
-            if re.match(pattern, text, re.IGNORECASE):
-                return True
-        return False
+        return self._compile_exclude_patterns().match(text) is not None
     
-    def _is_span_bold(self, span: Dict[str, Any]) -> bool:
+    @staticmethod
+    def _line_key(text: str, y_pos: float) -> int:
+        """Position-aware key of a line for running header/footer detection.
+        
+        Digits are masked so "Page 3" and "Page 4" share a key, and the height is
+        bucketed to 2pt to absorb small layout jitter between pages. Every line of
+        a document gets a key, so it is a 64-bit digest rather than the text;
+        blake2b rather than hash() keeps keys equal across page worker processes.
+        """
+        normalized = " ".join(_DIGITS.sub("#", text).lower().split())
+        key = f"{normalized}\0{int(round(y_pos / 2))}".encode('utf-8')
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+    
+    def _repeating_line_keys(self, pages_per_key: Counter, page_count: int) -> set:
+        """Keys of lines that recur on most pages of a document (running headers/footers).
+        
+        pages_per_key counts, for each line key, the pages it appears on.
+        """
+        min_pages = max(self.repeat_min_pages, page_count * self.repeat_page_ratio)
+        if page_count < min_pages:
+            return set()
+        return {key for key, count in pages_per_key.items() if count >= min_pages}
+    
+    def _is_span_bold(self, span: SpanRecord) -> bool:
         """Check if a text span is bold based on font name or flags."""
-        font_name = span.get('font', '').lower()
-        flags = span.get('flags', 0)
+        font_name = span.font.lower()
+        flags = span.flags
         
         # Check font name for bold indicators
         bold_indicators = ['bold', 'black', 'heavy', 'semibold']
@@ -42,92 +705,159 @@ class PDFStructureExtractor:
         
         return font_is_bold or flag_is_bold
     
-    def extract_text_blocks_by_position(self, pdf_path: str) -> List[Dict[str, Any]]:
+    def parse_document(self, pdf_path: Union[PDFSource, ParsedDocument]) -> ParsedDocument:
+        """Open and lay out a PDF once; already parsed documents are passed through."""
+        if isinstance(pdf_path, ParsedDocument):
+            return pdf_path
+        if self.page_workers > 1 and isinstance(pdf_path, str):
+            return self._parse_document_parallel(pdf_path)
+        return ParsedDocument(pdf_path, self.fast_layout)
+    
+    def _parse_document_parallel(self, pdf_path: str) -> ParsedDocument:
+        """Split a document's pages into contiguous ranges and parse them in worker processes.
+        
+        Each worker opens the file itself and returns page layouts plus heading
+        candidates for its range; the ranges are merged back in page order.
+        """
+        with PDFInput(pdf_path) as pdf:
+            page_count = len(pdf)
+            metadata = pdf.metadata
+        
+        workers = min(self.page_workers, page_count // self.min_pages_per_worker)
+        if workers <= 1:
+            return ParsedDocument(pdf_path, self.fast_layout)
+        
+        step = -(-page_count // workers)  # ceiling division
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        pages, page_elements, page_line_keys = [], [], []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_parse_page_range, self, pdf_path, start, stop) for start, stop in ranges]
+            for future in futures:
+                range_pages, range_elements, range_line_keys, record = future.result()
+                if record is not None:
+                    metrics.merge(record)
+                pages.extend(range_pages)
+                page_elements.extend(range_elements)
+                page_line_keys.extend(range_line_keys)
+        
+        return ParsedDocument.from_pages(pdf_path, metadata, pages, page_elements, page_line_keys)
+    
+    def extract_text_blocks_by_position(self, pdf_path: Union[str, ParsedDocument]) -> List[Dict[str, Any]]:
         """Extract text blocks grouped by vertical position to handle fragmentation."""
-        doc = fitz.open(pdf_path)
-        all_elements = []
+        doc = self.parse_document(pdf_path)
+        builder = OutlineBuilder(self, doc.metadata)
+        for page in self.iter_pages(doc):
+            builder.add_page(page)
+        return builder.candidates()
+    
+    def iter_pages(self, pdf_path: Union[PDFSource, ParsedDocument]) -> Iterator[PageLayout]:
+        """Yield each page's line records, heading candidates and line keys in page order.
         
-        for page_num, page in enumerate(doc):
-            # Get all text elements with their positions
-            text_dict = page.get_text("dict")
-            elements_by_line = defaultdict(list)
+        Given a path or stream, pages are laid out one at a time as the generator
+        is consumed and are not kept, so memory stays bounded for very long documents.
+        """
+        if isinstance(pdf_path, ParsedDocument):
+            doc = pdf_path
+            for page_num in range(len(doc)):
+                lines = doc.page_lines(page_num)
+                if doc.page_elements is not None:
+                    # Candidates were already found by the page workers
+                    yield PageLayout(page_num, lines, doc.page_elements[page_num], doc.page_line_keys[page_num])
+                else:
+                    yield PageLayout(page_num, lines, *self._extract_page_elements(page_num, lines))
+            return
+        
+        with PDFInput(pdf_path) as pdf:
+            yield from self._layout_pages(pdf)
+    
+    def _layout_pages(self, pdf: PDFInput) -> Iterator[PageLayout]:
+        for page_num, page in pdf.pages():
+            lines = _page_line_records(page, self.fast_layout)
+            del page
+            yield PageLayout(page_num, lines, *self._extract_page_elements(page_num, lines))
+    
+    def iter_document_structure(self, pdf_path: Union[PDFSource, ParsedDocument]) -> Iterator[Tuple[PageLayout, "OutlineBuilder"]]:
+        """Yield (page, builder) as each page is parsed and added to an OutlineBuilder.
+        
+        builder.outline() gives a provisional outline of the pages so far; once the
+        generator is exhausted, builder.structure() equals extract_document_structure().
+        """
+        if isinstance(pdf_path, ParsedDocument):
+            builder = OutlineBuilder(self, pdf_path.metadata)
+            for page in self.iter_pages(pdf_path):
+                builder.add_page(page)
+                yield page, builder
+            return
+        
+        with PDFInput(pdf_path) as pdf:
+            builder = OutlineBuilder(self, pdf.metadata)
+            for page in self._layout_pages(pdf):
+                builder.add_page(page)
+                yield page, builder
+    
+    def _extract_page_elements(self, page_num: int,
+                               lines: List[LineRecord]) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """Find the bold heading candidates on one page, plus the keys of all its lines."""
+        page_elements = []
+        line_keys = []
+        should_exclude = metrics.timed("exclude_patterns", self._should_exclude_text)
+        
+        # Spans grouped into visual lines by rounded Y position, in reading order
+        for y_pos, text, bold_count, span_count, font_size in SpanTable(lines, self._is_span_bold).line_groups():
+            combined_text = text.strip()
             
-            # Group spans by approximate Y position (line)
-            for block in text_dict.get("blocks", []):
-                if "lines" not in block:
-                    continue
-                
-                for line in block["lines"]:
-                    line_y = round(line["bbox"][1], 1)  # Round Y position
-                    
-                    for span in line["spans"]:
-                        if span["text"].strip():
-                            elements_by_line[line_y].append({
-                                "text": span["text"],
-                                "font_size": span["size"],
-                                "is_bold": self._is_span_bold(span),
-                                "x": span["bbox"][0],
-                                "font": span["font"],
-                                "flags": span["flags"]
-                            })
+            if not combined_text:
+                continue
+            line_keys.append(self._line_key(combined_text, y_pos))
+            if should_exclude(combined_text):
+                continue
             
-            # Reconstruct lines by combining spans with similar Y positions
-            for y_pos in sorted(elements_by_line.keys()):
-                spans = elements_by_line[y_pos]
-                if not spans:
-                    continue
-                
-                # Sort by X position to get correct reading order
-                spans.sort(key=lambda s: s["x"])
-                
-                # Combine text from spans
-                combined_text = "".join(span["text"] for span in spans).strip()
-                
-                if not combined_text or self._should_exclude_text(combined_text):
-                    continue
-                
-                # Determine if line is bold (majority of spans are bold)
-                bold_count = sum(1 for span in spans if span["is_bold"])
-                is_bold = bold_count > len(spans) / 2
-                
-                # Get representative font size (max font size in the line)
-                font_size = max(span["font_size"] for span in spans)
+            # Determine if line is bold (majority of spans are bold)
+            is_bold = bold_count > span_count / 2
+            
+            # Only keep meaningful headings
+            if (is_bold and 
+                len(combined_text) > 3 and 
+                len(combined_text) < 200 and
+                not _NO_LETTERS.match(combined_text)):  # Has letters
                 
-                # Only keep meaningful headings
-                if (is_bold and 
-                    len(combined_text) > 3 and 
-                    len(combined_text) < 200 and
-                    not re.match(r'^[^a-zA-Z]*$', combined_text)):  # Has letters
-                    
-                    all_elements.append({
-                        "text": combined_text,
-                        "page": page_num + 1,
-                        "font_size": round(font_size, 1),
-                        "is_bold": is_bold,
-                        "y_pos": y_pos
-                    })
-        
-        doc.close()
-        return all_elements
-    
-    def extract_title(self, pdf_path: str) -> str:
-        """Extract document title."""
-        doc = fitz.open(pdf_path)
+                page_elements.append({
+                    "text": combined_text,
+                    "page": page_num + 1,
+                    "font_size": round(font_size, 1),
+                    "is_bold": is_bold,
+                    "y_pos": y_pos
+                })
         
+        metrics.count("candidate_lines", len(page_elements))
+        return page_elements, line_keys
+    
+    def extract_title(self, pdf_path: Union[PDFSource, ParsedDocument]) -> str:
+        """Extract document title.
+        
+        Only the first page is used, so a path or stream is opened and laid out
+        for that page alone rather than parsed whole.
+        """
+        if isinstance(pdf_path, ParsedDocument):
+            return self._title_from(pdf_path.metadata, pdf_path.block_texts(0) if len(pdf_path) else None)
+        with PDFInput(pdf_path) as pdf:
+            text_blocks = None
+            for _, page in pdf.pages(0, min(1, len(pdf))):
+                text_blocks = _block_texts(_page_line_records(page, self.fast_layout))
+                del page
+            return self._title_from(pdf.metadata, text_blocks)
+    
+    def _title_from(self, metadata: Dict[str, Any], text_blocks: Optional[List[str]]) -> str:
+        """Pick the title from metadata, else from the first page's block texts."""
         # Try metadata first
-        metadata = doc.metadata
         title = metadata.get('title', '') or metadata.get('subject', '')
         
-        if not title:
+        if not title and text_blocks is not None:
             # Look for title-like text on first page
-            first_page = doc[0]
-            
-            # Use simple text extraction to find potential titles
-            text_blocks = first_page.get_text("blocks")
             title_candidates = []
             
-            for block in text_blocks:
-                text = block[4].strip()  # Text content
+            for block_text in text_blocks:
+                text = block_text.strip()
                 if (len(text) > 10 and 
                     any(word in text.lower() for word in ['rfp', 'request', 'proposal', 'ontario', 'digital', 'library'])):
                     title_candidates.append(text)
@@ -136,7 +866,6 @@ class PDFStructureExtractor:
                 # Take the longest meaningful title
                 title = max(title_candidates, key=len)
         
-        doc.close()
         return title or "Untitled Document"
     
     def create_font_hierarchy(self, sorted_font_sizes: List[float]) -> Dict[float, str]:
@@ -154,7 +883,7 @@ class PDFStructureExtractor:
     def clean_and_filter_headings(self, elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Clean and filter headings to remove duplicates and fragments."""
         cleaned = []
-        seen_texts = set()
+        seen_texts = _ContainmentIndex()
         
         # Sort by page and position
         elements.sort(key=lambda x: (x["page"], x["y_pos"]))
@@ -167,7 +896,7 @@ class PDFStructureExtractor:
                 continue
             
             # Skip if we've seen similar text
-            if any(text in seen or seen in text for seen in seen_texts):
+            if seen_texts.overlaps(text):
                 continue
             
             # Skip obvious fragments (text that doesn't start with capital or number)
@@ -183,41 +912,314 @@ class PDFStructureExtractor:
         
         return cleaned
     
-    def extract_document_structure(self, pdf_path: str) -> Dict[str, Any]:
-        """Extract complete document structure in the expected format."""
-        # Extract title
-        title = self.extract_title(pdf_path)
+    def extract_document_structure(self, pdf_path: Union[PDFSource, ParsedDocument],
+                                   include_positions: bool = False) -> Dict[str, Any]:
+        """Extract complete document structure in the expected format.
+        
+        With include_positions, each outline entry also carries the heading's
+        line "y_pos" so section chunking can split on it without searching.
+        """
+        cache_key = self.cache_key(pdf_path)
+        structure = self.cache.get(cache_key, "structure") if cache_key else None
+        if structure is not None:
+            metrics.count("cache_hits")
+        else:
+            structure = self._build_document_structure(pdf_path)
+            if cache_key:
+                self.cache.put(cache_key, "structure", structure)
         
-        # Extract all text elements
-        elements = self.extract_text_blocks_by_position(pdf_path)
+        if include_positions:
+            return structure
+        return {
+            "title": structure["title"],
+            "outline": [{key: value for key, value in entry.items() if key != "y_pos"}
+                        for entry in structure["outline"]]
+        }
+    
+    def _build_document_structure(self, pdf_path: Union[PDFSource, ParsedDocument]) -> Dict[str, Any]:
+        """Extract title and outline, keeping each heading's y_pos."""
+        if self.page_workers > 1 and isinstance(pdf_path, str):
+            pdf_path = self.parse_document(pdf_path)
+        # Otherwise stream: only the current page's layout is held in memory
+        builder = None
+        for _, builder in self.iter_document_structure(pdf_path):
+            pass
+        if builder is None:  # no pages
+            metadata = pdf_path.metadata if isinstance(pdf_path, ParsedDocument) else {}
+            builder = OutlineBuilder(self, metadata)
+        structure = builder.structure(include_positions=True)
+        metrics.count("headings_kept", len(structure["outline"]))
+        return structure
+
+class OutlineBuilder:
+    """Builds a document outline incrementally from PageLayouts in page order.
+    
+    Running headers, duplicate removal and the font size hierarchy depend on the
+    whole document, so outline() before the last page is provisional; the result
+    after all pages are added is the final structure.
+    """
+    def __init__(self, extractor: PDFStructureExtractor, metadata: Optional[Dict[str, Any]] = None):
+        self.extractor = extractor
+        self.metadata = metadata or {}
+        self.title = extractor._title_from(self.metadata, None)
+        self.page_elements = []
+        # Pages each line key appeared on, counted as pages are added
+        self.pages_per_line_key = Counter()
+    
+    def __len__(self) -> int:
+        return len(self.page_elements)
+    
+    def add_page(self, page: PageLayout):
+        if page.page_num != len(self.page_elements):
+            raise ValueError(f"Expected page {len(self.page_elements)}, got {page.page_num}")
+        if page.page_num == 0:
+            self.title = self.extractor._title_from(self.metadata, _block_texts(page.lines))
+        self.page_elements.append(page.elements)
+        self.pages_per_line_key.update(set(page.line_keys))
+    
+    def candidates(self) -> List[Dict[str, Any]]:
+        """Heading candidates of the pages so far, minus running headers/footers."""
+        line_key = self.extractor._line_key
+        # Drop running headers/footers learned from this document's own pages
+        repeating = self.extractor._repeating_line_keys(self.pages_per_line_key, len(self.page_elements))
+        return [
+            element for elements in self.page_elements for element in elements
+            if not repeating or line_key(element["text"], element["y_pos"]) not in repeating
+        ]
+    
+    def outline(self, include_positions: bool = False) -> List[Dict[str, Any]]:
+        """Outline entries (level, text, page, and y_pos if requested) of the pages so far."""
+        title = self.title
         
         # Clean and filter headings
-        headings = self.clean_and_filter_headings(elements)
+        with metrics.stage("clean_and_filter_headings"):
+            headings = self.extractor.clean_and_filter_headings(self.candidates())
         
         # Get unique font sizes and create hierarchy
-        if headings:
-            font_sizes = sorted(list(set(h["font_size"] for h in headings)), reverse=True)
-            font_hierarchy = self.create_font_hierarchy(font_sizes)
-            
-            # Build outline
-            outline = []
-            for heading in headings:
-                # Skip if this text is part of the title
-                if heading["text"] in title or title in heading["text"]:
-                    continue
-                
-                font_size = heading["font_size"]
-                level = font_hierarchy.get(font_size, "H6")
-                
-                outline.append({
-                    "level": level,
-                    "text": heading["text"],
-                    "page": heading["page"]
-                })
-        else:
-            outline = []
+        font_sizes = sorted(set(h["font_size"] for h in headings), reverse=True)
+        font_hierarchy = self.extractor.create_font_hierarchy(font_sizes)
         
+        # Build outline
+        outline = []
+        for heading in headings:
+            # Skip if this text is part of the title
+            if heading["text"] in title or title in heading["text"]:
+                continue
+            
+            entry = {
+                "level": font_hierarchy.get(heading["font_size"], "H6"),
+                "text": heading["text"],
+                "page": heading["page"]
+            }
+            if include_positions:
+                entry["y_pos"] = heading["y_pos"]
+            outline.append(entry)
+        return outline
+    
+    def structure(self, include_positions: bool = False) -> Dict[str, Any]:
         return {
-            "title": title,
-            "outline": outline
+            "title": self.title,
+            "outline": self.outline(include_positions)
         }
+
+def _cgroup_cpu_limit() -> Optional[int]:
+    """CPUs allowed by the container's cgroup quota (v2 cpu.max or v1 CFS), rounded up; None when unlimited."""
+    for quota_path, period_path in (("/sys/fs/cgroup/cpu.max", None),
+                                    ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us")):
+        try:
+            with open(quota_path, 'r') as f:
+                fields = f.read().split()
+            if period_path:
+                with open(period_path, 'r') as f:
+                    fields.append(f.read().strip())
+            quota, period = fields[0], int(fields[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if quota in ("max", "-1") or period <= 0:
+            return None
+        return max(1, -(-int(quota) // period))  # ceiling division
+    return None
+
+def available_cpus() -> int:
+    """CPUs this process can actually use: its affinity mask, capped by the cgroup CPU quota.
+    
+    os.cpu_count() is the host's core count, which oversubscribes CPU-limited
+    containers when used to size worker pools or torch threads.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # no affinity API on this platform
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    return max(1, min(cpus, limit) if limit is not None else cpus)
+
+# Extractor owned by the current pool worker process (see DocumentPool)
+_worker_extractor = None
+
+def _init_worker(extractor_options: Dict[str, Any]):
+    global _worker_extractor
+    _worker_extractor = PDFStructureExtractor(**extractor_options)
+
+def _run_task(task: Callable, extractor: PDFStructureExtractor,
+              pdf_path: str) -> Tuple[Any, Optional[str], Optional[Dict[str, Dict[str, float]]]]:
+    """Run one document task, turning an exception into an error message.
+    
+    Returns (result, error, record); with metrics enabled, record holds the
+    document's stage times and counts, which are also logged, else it is None.
+    """
+    before = metrics.snapshot() if metrics.enabled else None
+    try:
+        with metrics.stage("document"):
+            result, error = task(extractor, pdf_path), None
+    except Exception as e:
+        result, error = None, str(e)
+    if before is None:
+        return result, error, None
+    metrics.count("documents")
+    if error is not None:
+        metrics.count("document_errors")
+    record = metrics.since(before)
+    metrics.log(record, scope="document", document=os.path.basename(source_name(pdf_path)))
+    return result, error, record
+
+def _run_worker_task(task: Callable, pdf_path: str) -> Tuple[Any, Optional[str], Optional[Dict[str, Dict[str, float]]]]:
+    return _run_task(task, _worker_extractor, pdf_path)
+
+class DocumentPool:
+    """Worker processes that each keep a PDFStructureExtractor for as long as the pool lives.
+    
+    submit(task, pdf_path) runs task(extractor, pdf_path) in a worker and returns a
+    future; result(future) gives its (result, error) pair. Long-lived callers (e.g. a service) keep one
+    pool open so workers are started and their extractors built only once.
+    
+    A worker that dies (e.g. MuPDF crashing on a malformed file) breaks the whole
+    executor, failing every task in flight. The pool then replaces the executor
+    and resubmits those tasks. A task caught in a second crash runs alone in a
+    one-worker pool, and only a document that crashes that pool too gets an
+    error, so the other documents still succeed.
+    """
+    def __init__(self, workers: int, **extractor_options):
+        self.workers = workers
+        self.extractor_options = extractor_options
+        self._lock = threading.Lock()
+        self._closed = False
+        self._pool = self._new_executor(workers)
+    
+    def _new_executor(self, workers: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.extractor_options,))
+    
+    def submit(self, task: Callable, pdf_path: str) -> Future:
+        """Submit a document task; crashed workers are replaced and the task retried."""
+        future = Future()
+        self._dispatch(task, pdf_path, future, 0)
+        return future
+    
+    def _dispatch(self, task: Callable, pdf_path: str, future: Future, crashes: int):
+        """Run a task on the shared executor, or alone once it has been caught in two crashes."""
+        isolated = crashes >= 2
+        executor = None
+        try:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("DocumentPool is closed")
+                executor = self._new_executor(1) if isolated else self._pool
+                running = executor.submit(_run_worker_task, task, pdf_path)
+        except BrokenProcessPool:  # broke before this task got in
+            self._finish_crashed(executor, task, pdf_path, future, crashes, isolated)
+            return
+        except Exception as e:
+            future.set_exception(e)
+            return
+        running.add_done_callback(
+            lambda done: self._finished(done, executor, task, pdf_path, future, crashes, isolated))
+    
+    def _finished(self, done: Future, executor: ProcessPoolExecutor, task: Callable, pdf_path: str,
+                  future: Future, crashes: int, isolated: bool):
+        if isolated:
+            executor.shutdown(wait=False)
+        try:
+            outcome = done.result()
+        except BrokenProcessPool:
+            self._finish_crashed(executor, task, pdf_path, future, crashes, isolated)
+            return
+        except BaseException as e:  # e.g. cancelled when the pool was closed
+            future.set_exception(e)
+            return
+        future.set_result(outcome)
+    
+    def _finish_crashed(self, executor: ProcessPoolExecutor, task: Callable, pdf_path: str, future: Future,
+                        crashes: int, isolated: bool):
+        if isolated:
+            future.set_result((None, "worker process crashed on this document", None))
+            return
+        with self._lock:
+            # The first task to see the crash replaces the executor for everyone
+            if executor is self._pool and not self._closed:
+                executor.shutdown(wait=False)
+                self._pool = self._new_executor(self.workers)
+        self._dispatch(task, pdf_path, future, crashes + 1)
+    
+    @staticmethod
+    def result(future: Future) -> Tuple[Any, Optional[str]]:
+        """The (result, error) pair of a submitted task, also when its worker died.
+        
+        The worker's metrics record for the document is added to this process's totals.
+        """
+        try:
+            result, error, record = future.result()
+        except Exception as e:  # e.g. BrokenProcessPool after a worker crash
+            return None, str(e) or type(e).__name__
+        if record is not None:
+            metrics.merge(record)
+        return result, error
+    
+    def close(self):
+        with self._lock:
+            self._closed = True
+            executor = self._pool
+        executor.shutdown()
+    
+    def __enter__(self) -> "DocumentPool":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def imap_documents(task: Callable, pdf_paths: List[str], workers: int = 1,
+                   **extractor_options) -> Iterator[Tuple[Any, Optional[str]]]:
+    """Apply task(extractor, pdf_path) to every PDF, yielding results as they are ready.
+    
+    Each worker process owns its own PDFStructureExtractor and opens its own
+    documents. Results are (result, error) pairs in the order of pdf_paths; a
+    document that fails, or whose worker dies, only gets an error message.
+    At most two documents per worker are in flight, so a slow consumer does
+    not let finished results pile up. task must be a module-level function so
+    it can be sent to the workers. extractor_options (page_workers, cache)
+    configure every extractor.
+    """
+    if workers <= 1 or len(pdf_paths) <= 1:
+        extractor = PDFStructureExtractor(**extractor_options)
+        for pdf_path in pdf_paths:
+            result, error, _ = _run_task(task, extractor, pdf_path)
+            yield result, error
+        return
+    
+    workers = min(workers, len(pdf_paths))
+    with DocumentPool(workers, **extractor_options) as pool:
+        pending = deque()
+        remaining = iter(pdf_paths)
+        for pdf_path in islice(remaining, 2 * workers):
+            pending.append(pool.submit(task, pdf_path))
+        while pending:
+            result = pool.result(pending.popleft())
+            for pdf_path in islice(remaining, 1):
+                pending.append(pool.submit(task, pdf_path))
+            yield result
+
+def map_documents(task: Callable, pdf_paths: List[str], workers: int = 1,
+                  **extractor_options) -> List[Tuple[Any, Optional[str]]]:
+    """Like imap_documents, but collect all (result, error) pairs into a list."""
+    return list(imap_documents(task, pdf_paths, workers, **extractor_options))
+
+def _extract_structure(extractor: PDFStructureExtractor, pdf_path: str) -> Dict[str, Any]:
+    return extractor.extract_document_structure(pdf_path)
@@ -0,0 +1,203 @@
+import json
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+from batch_pipeline import pipeline
+from embeddings import DEFAULT_BATCH_SIZE, EmbeddingCache, load_model, model_identity, set_encoder_threads
+from pdf_extractor import DocumentPool, ExtractionCache, available_cpus, metrics
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while max_pending jobs are already queued or running."""
+
+def outline_task(extractor, pdf_path: str) -> Dict[str, Any]:
+    return extractor.extract_document_structure(pdf_path)
+
+class DocumentService:
+    """Keeps PDF workers and the embedding model warm and runs outline and ranking jobs.
+
+    Jobs go through a bounded queue: submit() raises QueueFull rather than
+    queueing more than max_pending jobs, so callers see backpressure instead of
+    unbounded latency. Documents are extracted in a persistent DocumentPool,
+    which replaces crashed workers, so one bad PDF does not take the service
+    down; ranking runs in job threads against the one loaded model.
+    """
+    def __init__(self, model_path: str, workers: int = 1, job_threads: int = 2, max_pending: int = 16,
+                 embedding_cache: Optional[EmbeddingCache] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 quantize: bool = False, **extractor_options):
+        self.model_path = model_path
+        self.embedding_cache = embedding_cache
+        self.batch_size = batch_size
+        self.quantize = quantize
+        self.max_pending = max_pending
+        self.documents = DocumentPool(max(1, workers), **extractor_options)
+        self._jobs = ThreadPoolExecutor(max_workers=job_threads)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Encoding is serialized; torch already parallelizes each batch across threads
+        self._model_lock = threading.Lock()
+        load_model(model_path, quantize)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, job: Callable, *args) -> Future:
+        """Queue job(*args); raises QueueFull when max_pending jobs are outstanding."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"{self.max_pending} jobs already pending")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._jobs.submit(job, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def outline(self, pdf_path: str) -> Dict[str, Any]:
+        """Title and outline of one PDF, as 1A writes it."""
+        structure, error = DocumentPool.result(self.documents.submit(outline_task, pdf_path))
+        if error is not None:
+            raise RuntimeError(error)
+        return structure
+
+    def rank(self, pdf_paths: List[str], persona: str, job: str, top_k: int = 10) -> Dict[str, Any]:
+        """Rank the sections of the given PDFs for a persona, as 1B writes its output."""
+        futures = [self.documents.submit(pipeline.extract_document_sections, pdf_path) for pdf_path in pdf_paths]
+        sections = []
+        for pdf_path, future in zip(pdf_paths, futures):
+            doc_sections, error = DocumentPool.result(future)
+            if error is not None:
+                sys.stderr.write(f"Error processing {os.path.basename(pdf_path)}: {error}\n")
+                metrics.count("failed_documents")
+            elif doc_sections:
+                sections.extend(doc_sections)
+        with self._model_lock:
+            ranked = pipeline.rank_sections_for_persona(sections, persona, job, self.model_path,
+                                                        self.embedding_cache, top_k=top_k,
+                                                        batch_size=self.batch_size, quantize=self.quantize)
+        return pipeline.make_final_output(pdf_paths, persona, job, ranked, top_k=top_k)
+
+    def close(self):
+        self._jobs.shutdown()
+        self.documents.close()
+
+def _existing_file(path: Any) -> str:
+    """A requested PDF path: ValueError unless it is a string, FileNotFoundError unless the file exists."""
+    if not isinstance(path, str):
+        raise ValueError("PDF paths must be strings")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"no such file: {path}")
+    return path
+
+def _pdf_paths(request: Dict[str, Any]) -> List[str]:
+    if "input_dir" in request:
+        input_dir = request["input_dir"]
+        if not isinstance(input_dir, str):
+            raise ValueError("input_dir must be a string")
+        if not os.path.isdir(input_dir):
+            raise FileNotFoundError(f"no such directory: {input_dir}")
+        return [os.path.join(input_dir, f) for f in sorted(os.listdir(input_dir)) if f.lower().endswith('.pdf')]
+    pdf_paths = request["pdf_paths"]
+    if not isinstance(pdf_paths, list):
+        raise ValueError("pdf_paths must be a list of paths")
+    return [_existing_file(pdf_path) for pdf_path in pdf_paths]
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """POST /outline {"pdf_path"} and POST /rank {"pdf_paths" | "input_dir", "persona", "job", "top_k"}.
+
+    Malformed requests answer 400 and missing PDFs or directories 404; a full
+    queue answers 503 with Retry-After. GET /health reports the queue depth.
+    """
+    service: DocumentService = None
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+        self._send_json(200, {"pending": self.service.pending, "max_pending": self.service.max_pending})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("expected a JSON object")
+            if self.path == "/outline":
+                future = self.service.submit(self.service.outline, _existing_file(request["pdf_path"]))
+            elif self.path == "/rank":
+                future = self.service.submit(self.service.rank, _pdf_paths(request), request["persona"],
+                                             request["job"], int(request.get("top_k", 10)))
+            else:
+                self._send_json(404, {"error": "not found"})
+                return
+        except QueueFull as e:
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+            return
+        except FileNotFoundError as e:
+            self._send_json(404, {"error": str(e)})
+            return
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            self._send_json(400, {"error": f"bad request: {e}"})
+            return
+
+        try:
+            self._send_json(200, future.result())
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+if __name__ == "__main__":
+    MODEL_PATH = os.environ.get("MODEL_PATH", "local_model")
+    HOST = os.environ.get("SERVICE_HOST", "127.0.0.1")
+    PORT = int(os.environ.get("SERVICE_PORT", 8080))
+    WORKERS = int(os.environ.get("PDF_WORKERS", available_cpus()))
+    JOB_THREADS = int(os.environ.get("SERVICE_JOB_THREADS", 2))    # Jobs running at once
+    MAX_PENDING = int(os.environ.get("SERVICE_MAX_PENDING", 16))    # Queued + running jobs before 503
+    CACHE_DIR = os.environ.get("PDF_CACHE_DIR")
+    CACHE_MAX_MB = int(os.environ.get("PDF_CACHE_MAX_MB", 512))
+    EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR")
+    EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    EMBED_THREADS = int(os.environ.get("EMBED_THREADS", available_cpus()))
+    EMBED_INT8 = os.environ.get("EMBED_INT8") == "1"
+
+    set_encoder_threads(EMBED_THREADS)
+    cache = ExtractionCache(CACHE_DIR, max_bytes=CACHE_MAX_MB * 1024 * 1024) if CACHE_DIR else None
+    embedding_cache = None
+    if EMBEDDING_CACHE_DIR:
+        embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR,
+                                         model_identity(MODEL_PATH, EMBED_INT8, EMBEDDING_CACHE_DIR))
+
+    service = DocumentService(MODEL_PATH, workers=WORKERS, job_threads=JOB_THREADS, max_pending=MAX_PENDING,
+                              embedding_cache=embedding_cache, batch_size=EMBED_BATCH_SIZE, quantize=EMBED_INT8,
+                              cache=cache)
+    ServiceHandler.service = service
+    server = ThreadingHTTPServer((HOST, PORT), ServiceHandler)
+    print(f"Serving on http://{HOST}:{PORT} (workers: {WORKERS}, jobs: {JOB_THREADS}, max pending: {MAX_PENDING})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
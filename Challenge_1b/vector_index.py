@@ -0,0 +1,219 @@
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length so a dot product is a cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        return vectors / max(float(np.linalg.norm(vectors)), 1e-12)
+    norms = np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors / norms
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first, without sorting everything."""
+    if top_k <= 0 or len(scores) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if top_k < len(scores):
+        # Everything above the k-th best score, then the earliest rows tied with it,
+        # so ties at the cut keep the same rows sorted() would
+        kth_score = -np.partition(-scores, top_k - 1)[top_k - 1]
+        above = np.flatnonzero(scores > kth_score)
+        candidates = np.concatenate([above, np.flatnonzero(scores == kth_score)[:top_k - len(above)]])
+    else:
+        candidates = np.arange(len(scores))
+    # Stable order among equal scores, like sorted() on the full list
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+class VectorIndex:
+    """Normalized section embeddings with their section records, for top-k search.
+
+    Saved as vectors.npy (loadable memory-mapped), records.json and meta.json.
+    Several saved indexes (e.g. one per collection) can be concatenated and
+    queried together. An optional IVF layer (k-means lists over the rows) gives
+    approximate search for very large indexes; it is saved with the index.
+    """
+    def __init__(self, vectors: np.ndarray, records: List[Dict[str, Any]], model_id: str = ""):
+        if len(vectors) != len(records):
+            raise ValueError(f"{len(vectors)} vectors but {len(records)} records")
+        self.vectors = vectors
+        self.records = records
+        self.model_id = model_id
+        self.centroids: Optional[np.ndarray] = None
+        self.list_offsets: Optional[np.ndarray] = None
+        self.list_rows: Optional[np.ndarray] = None
+
+    @classmethod
+    def build(cls, sections: List[Dict[str, Any]], embeddings: np.ndarray, model_id: str = "") -> "VectorIndex":
+        """Index sections (dicts with document/heading/page/chunk) by their embeddings."""
+        records = [{key: section[key] for key in ('document', 'heading', 'page', 'chunk')} for section in sections]
+        return cls(normalize_rows(embeddings).reshape(len(records), -1), records, model_id)
+
+    @classmethod
+    def concatenate(cls, indexes: List["VectorIndex"]) -> "VectorIndex":
+        """Combine indexes built with the same model into one.
+
+        When every index has IVF lists, the combined index keeps all of them
+        (each list still only holds rows of its own index), so it needs no
+        re-clustering; otherwise it has none.
+        """
+        model_ids = {index.model_id for index in indexes}
+        if len(model_ids) > 1:
+            raise ValueError(f"Cannot combine indexes built with different models: {sorted(model_ids)}")
+        vectors = np.concatenate([np.asarray(index.vectors) for index in indexes])
+        records = [record for index in indexes for record in index.records]
+        combined = cls(vectors, records, model_ids.pop() if model_ids else "")
+        if indexes and all(index.centroids is not None for index in indexes):
+            row_starts = np.cumsum([0] + [len(index) for index in indexes[:-1]])
+            combined.centroids = np.concatenate([index.centroids for index in indexes])
+            combined.list_rows = np.concatenate([np.asarray(index.list_rows) + start
+                                                 for index, start in zip(indexes, row_starts)])
+            combined.list_offsets = np.concatenate([[0]] + [np.asarray(index.list_offsets[1:]) + start
+                                                            for index, start in zip(indexes, row_starts)])
+        return combined
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def save(self, index_dir: str, sources: Optional[List[Any]] = None):
+        """Write the index to index_dir; sources records what a derived index was built from."""
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, 'vectors.npy'), np.asarray(self.vectors, dtype=np.float32))
+        with open(os.path.join(index_dir, 'records.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.records, f, ensure_ascii=False)
+        meta = {"model_id": self.model_id, "count": len(self), "ivf": self.centroids is not None}
+        if sources is not None:
+            meta["sources"] = sources
+        if self.centroids is not None:
+            np.save(os.path.join(index_dir, 'ivf_centroids.npy'), self.centroids)
+            np.save(os.path.join(index_dir, 'ivf_offsets.npy'), self.list_offsets)
+            np.save(os.path.join(index_dir, 'ivf_rows.npy'), self.list_rows)
+        with open(os.path.join(index_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True) -> "VectorIndex":
+        """Load a saved index; with mmap the vectors stay on disk until touched."""
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, 'records.json'), 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        index = cls(np.load(os.path.join(index_dir, 'vectors.npy'), mmap_mode=mmap_mode), records, meta.get("model_id", ""))
+        if meta.get("ivf"):
+            index.centroids = np.load(os.path.join(index_dir, 'ivf_centroids.npy'))
+            index.list_offsets = np.load(os.path.join(index_dir, 'ivf_offsets.npy'))
+            index.list_rows = np.load(os.path.join(index_dir, 'ivf_rows.npy'), mmap_mode=mmap_mode)
+        return index
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, seed: int = 0):
+        """Cluster the rows with spherical k-means into inverted lists for approximate search."""
+        vectors = np.asarray(self.vectors)
+        n_rows = len(vectors)
+        if n_rows == 0:
+            return
+        n_lists = min(n_lists or max(1, int(np.sqrt(n_rows))), n_rows)
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n_rows, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]  # keep empty lists where they were
+            centroids = normalize_rows(sums)
+        assignment = self._assign(vectors, centroids)
+        self.centroids = centroids
+        self.list_rows = np.argsort(assignment, kind='stable')
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Nearest centroid of every row, in blocks to bound the score matrix size."""
+        return np.concatenate([
+            np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), block_size)
+        ])
+
+    def search(self, query_emb: np.ndarray, top_k: int = 10, n_probe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return (row, cosine similarity) of the top_k rows, best first.
+
+        With n_probe and an IVF layer, only rows in the n_probe closest lists are
+        scored; otherwise every row is scored exactly.
+        """
+        query = normalize_rows(query_emb)
+        if n_probe and self.centroids is not None:
+            lists = top_k_indices(self.centroids @ query, n_probe)
+            rows = np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists])
+            rows.sort()
+            scores = np.asarray(self.vectors[rows]) @ query
+        else:
+            rows = None
+            scores = np.asarray(self.vectors) @ query
+        best = top_k_indices(scores, top_k)
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in best]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def query_sections(self, query_emb: np.ndarray, top_k: int = 10, n_probe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top-k section records with a 'similarity' key, best first."""
+        return [dict(self.records[row], similarity=score) for row, score in self.search(query_emb, top_k, n_probe)]
+
+def index_sources(index_dirs: List[str]) -> List[List[Any]]:
+    """Identity of saved indexes: each directory and its meta.json modification time."""
+    return [[os.path.abspath(index_dir), os.stat(os.path.join(index_dir, 'meta.json')).st_mtime_ns]
+            for index_dir in index_dirs]
+
+def load_combined_index(index_dirs: List[str], combined_dir: str, n_lists: Optional[int] = None) -> VectorIndex:
+    """Several saved indexes as one with IVF lists, clustered once and saved in combined_dir.
+
+    The saved combination is reused while none of its source indexes changed,
+    so approximate queries over it do not re-run k-means each time.
+    """
+    sources = index_sources(index_dirs)
+    meta_path = os.path.join(combined_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("sources") == sources and meta.get("ivf"):
+            return VectorIndex.load(combined_dir)
+    index = VectorIndex.concatenate([VectorIndex.load(index_dir) for index_dir in index_dirs])
+    index.build_ivf(n_lists)
+    index.save(combined_dir, sources)
+    return VectorIndex.load(combined_dir)
+
+if __name__ == "__main__":
+    # Query one or more saved collection indexes together:
+    #   python vector_index.py "<persona>" "<job>" <index_dir> [<index_dir> ...]
+    from embeddings import embed_texts, load_model, model_identity, persona_query
+
+    if len(sys.argv) < 4:
+        print("Usage: python vector_index.py <persona> <job> <index_dir> [<index_dir> ...]")
+        sys.exit(1)
+    persona, job, index_dirs = sys.argv[1], sys.argv[2], sys.argv[3:]
+    model_path = os.environ.get("MODEL_PATH", "local_model")
+    top_k = int(os.environ.get("TOP_K", 10))
+    n_probe = int(os.environ.get("IVF_PROBE", 0)) or None
+    quantize = os.environ.get("EMBED_INT8") == "1"    # Query with the int8 model the index was built with
+    combined_dir = os.environ.get("COMBINED_INDEX_DIR")    # Cluster indexes without IVF lists once, saved here
+
+    indexes = [VectorIndex.load(index_dir) for index_dir in index_dirs]
+    index = indexes[0] if len(indexes) == 1 else VectorIndex.concatenate(indexes)
+    if n_probe and index.centroids is None:
+        if combined_dir:
+            index = load_combined_index(index_dirs, combined_dir)
+        else:
+            print("Warning: no IVF lists to probe, searching exactly (build them with VECTOR_INDEX_IVF_LISTS "
+                  "or set COMBINED_INDEX_DIR)")
+            n_probe = None
+    # Model file digests are kept with the first index so queries do not re-hash the weights
+    digest_dir = os.environ.get("EMBEDDING_CACHE_DIR") or index_dirs[0]
+    if index.model_id and index.model_id != model_identity(model_path, quantize, digest_dir):
+        print(f"Warning: index was built with a different model than {model_path}" + (" (int8)" if quantize else ""))
+    query_emb = embed_texts(load_model(model_path, quantize), [persona_query(persona, job)])[0]
+    results = index.query_sections(query_emb, top_k=top_k, n_probe=n_probe)
+    print(json.dumps([{key: section[key] for key in ('document', 'page', 'heading', 'similarity')}
+                      for section in results], indent=2, ensure_ascii=False))
@@ -0,0 +1,50 @@
+"""Compare page layout throughput of the full and text-only (fast) extraction modes.
+
+Usage: python benchmarks/layout_extraction.py [pdf ...]
+Defaults to every PDF in the repository's sample collections.
+"""
+import glob
+import importlib.util
+import os
+import sys
+import time
+
+import fitz
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_extractor_module():
+    spec = importlib.util.spec_from_file_location("extractor_1a", os.path.join(ROOT, "Challenge_1a", "1A.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def pages_per_second(pdf_paths, layout):
+    pages = 0
+    start = time.perf_counter()
+    for pdf_path in pdf_paths:
+        pages += len(layout(pdf_path))
+    elapsed = time.perf_counter() - start
+    return pages, elapsed, pages / elapsed if elapsed else float("inf")
+
+if __name__ == "__main__":
+    extractor = load_extractor_module()
+    pdf_paths = sys.argv[1:] or sorted(
+        glob.glob(os.path.join(ROOT, "Challenge_1a", "sample_dataset", "pdfs", "*.pdf")) +
+        glob.glob(os.path.join(ROOT, "Challenge_1b", "Collection *", "PDFs", "*.pdf"))
+    )
+
+    def raw_dict(pdf_path):
+        # The unconverted get_text("dict") output, images included
+        with fitz.open(pdf_path) as doc:
+            return [page.get_text("dict") for page in doc]
+
+    modes = [
+        ("raw dict", raw_dict),
+        ("full", lambda pdf_path: extractor.ParsedDocument(pdf_path, fast_layout=False)),
+        ("fast", lambda pdf_path: extractor.ParsedDocument(pdf_path, fast_layout=True)),
+    ]
+    print(f"{len(pdf_paths)} PDFs")
+    for name, layout in modes:
+        pages, elapsed, rate = pages_per_second(pdf_paths, layout)
+        print(f"{name:>8}: {pages} pages in {elapsed:.2f}s ({rate:.1f} pages/s)")
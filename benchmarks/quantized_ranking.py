@@ -0,0 +1,72 @@
+"""Compare 1B ranking with the fp32 and the int8-quantized encoder.
+
+Usage: python benchmarks/quantized_ranking.py [collection_dir ...]
+Defaults to every Challenge_1b collection. For each one the sections are
+extracted once and ranked with both models; the report gives the encoding
+speedup and how far the int8 extracted_sections agree with the fp32 ones:
+shared sections in the top 10, sections at the same rank, and the mean rank
+shift of shared sections. MODEL_PATH (default Challenge_1b/local_model)
+selects the model.
+"""
+import glob
+import importlib.util
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOP_K = 10
+
+def load_pipeline():
+    sys.path.insert(0, os.path.join(ROOT, "Challenge_1b"))
+    spec = importlib.util.spec_from_file_location("pipeline_1b", os.path.join(ROOT, "Challenge_1b", "1B.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["pipeline_1b"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def section_key(section):
+    return section["document"], section["section_title"], section["page_number"]
+
+def agreement(reference, candidate):
+    """(shared sections, sections at the same rank, mean rank shift of shared ones)."""
+    reference_ranks = {section_key(section): rank for rank, section in enumerate(reference)}
+    shifts = [abs(rank - reference_ranks[section_key(section)]) for rank, section in enumerate(candidate)
+              if section_key(section) in reference_ranks]
+    same = sum(1 for a, b in zip(reference, candidate) if section_key(a) == section_key(b))
+    return len(shifts), same, sum(shifts) / len(shifts) if shifts else 0.0
+
+def texts_per_second(pipeline, model, texts):
+    pipeline.embed_texts(model, texts[:8])  # warm up
+    start = time.perf_counter()
+    pipeline.embed_texts(model, texts)
+    return len(texts) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    pipeline = load_pipeline()
+    model_path = os.environ.get("MODEL_PATH", os.path.join(ROOT, "Challenge_1b", "local_model"))
+    collection_dirs = sys.argv[1:] or sorted(glob.glob(os.path.join(ROOT, "Challenge_1b", "Collection *")))
+    fp32_model = pipeline.load_model(model_path)
+    int8_model = pipeline.load_model(model_path, quantize=True)
+
+    for collection_dir in collection_dirs:
+        pdf_paths = sorted(glob.glob(os.path.join(collection_dir, "PDFs", "*.pdf")))
+        sections = list(pipeline.iter_collection_sections(pdf_paths))
+        persona, job = pipeline.load_challenge_config(os.path.join(collection_dir, "challenge1b_input.json"))
+        if not sections or not persona:
+            print(f"{os.path.basename(collection_dir)}: nothing to rank")
+            continue
+        texts = [pipeline.section_text(section) for section in sections]
+        fp32_rate = texts_per_second(pipeline, fp32_model, texts)
+        int8_rate = texts_per_second(pipeline, int8_model, texts)
+
+        outputs = []
+        for quantize in (False, True):
+            ranked = pipeline.rank_sections_for_persona([dict(section) for section in sections], persona, job,
+                                                        model_path, top_k=TOP_K, quantize=quantize)
+            outputs.append(pipeline.make_final_output(pdf_paths, persona, job, ranked, top_k=TOP_K)["extracted_sections"])
+        shared, same, shift = agreement(*outputs)
+        print(f"{os.path.basename(collection_dir)}: {len(texts)} sections")
+        print(f"  encode: fp32 {fp32_rate:.1f} texts/s, int8 {int8_rate:.1f} texts/s ({int8_rate / fp32_rate:.2f}x)")
+        print(f"  top {TOP_K}: {shared}/{len(outputs[0])} shared, {same} at the same rank, "
+              f"mean rank shift {shift:.2f}")
@@ -0,0 +1,357 @@
+"""Throughput, latency and output regression suite for the 1A and 1B pipelines.
+
+Usage: python benchmarks/run_benchmarks.py [--save-baseline] [--skip-1b] [--check-timings] [--repeat 5]
+                                          [--tolerance 0.2]
+
+Runs 1A over Challenge_1a/sample_dataset/pdfs and a synthetic large PDF, and
+1B over Challenge_1b/Collection 1-3. Reports pages/sec, per-document p50/p95
+latency, peak RSS and embedding throughput, checks outputs against the shipped
+expected JSON files, and compares everything with benchmarks/baseline.json.
+Regressions (exit status 1) are changed outputs, fewer expected or reference
+sections matched, peak RSS more than --tolerance higher, and peak RSS growing
+faster than MAX_RSS_GROWTH_MB per 1000 pages between synthetic PDFs of
+MEMORY_PAGES sizes.
+
+Timings are the median of --repeat passes after an untimed warm-up pass. They
+depend on the machine, so they only gate the run with --check-timings, and only
+against a baseline saved on the same machine; otherwise they are informational.
+MODEL_PATH (default Challenge_1b/local_model) selects the model for 1B ranking;
+ranking is skipped when the model cannot be loaded.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Metric name -> True when higher is better
+METRICS = {
+    "pages_per_sec": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "peak_rss_mb": False,
+    "texts_per_sec": True,
+}
+# Metrics measured in time, comparable only on the machine the baseline was saved on
+TIMING_METRICS = {"pages_per_sec", "p50_ms", "p95_ms", "texts_per_sec"}
+
+# Synthetic document sizes whose peak RSS is compared; memory should not grow with the
+# page count beyond what the output itself needs (MB per 1000 pages)
+MEMORY_PAGES = (300, 2000)
+MAX_RSS_GROWTH_MB = {"1a": 12, "1b": 25}
+
+def load_module(name, path):
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def machine():
+    """What timings depend on: host, CPU and Python version."""
+    return {
+        "host": platform.node(),
+        "cpu": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+def timed_passes(extract, pdf_paths, repeat):
+    """Run extract over pdf_paths once untimed, then repeat timed passes.
+
+    Returns the median pass time in seconds, each document's median latency in
+    ms, and the outputs of the last pass.
+    """
+    for pdf_path in pdf_paths:
+        extract(pdf_path)
+    pass_seconds, latencies, outputs = [], [[] for _ in pdf_paths], []
+    for _ in range(repeat):
+        outputs = []
+        start = time.perf_counter()
+        for pdf_path, doc_latencies in zip(pdf_paths, latencies):
+            doc_start = time.perf_counter()
+            outputs.append(extract(pdf_path))
+            doc_latencies.append((time.perf_counter() - doc_start) * 1000)
+        pass_seconds.append(time.perf_counter() - start)
+    return statistics.median(pass_seconds), [statistics.median(values) for values in latencies], outputs
+
+def page_count(pdf_paths):
+    import fitz
+    pages = 0
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            pages += len(doc)
+    return pages
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def make_synthetic_pdf(path, pages=300, headings_per_page=10):
+    """A long document with thousands of bold heading lines between body text.
+
+    Heading wording and spacing vary from page to page, so the headings are not
+    mistaken for running headers; the page header and footer lines are.
+    """
+    import fitz
+    topics = ["Revenue", "Logistics", "Staffing", "Compliance", "Outreach", "Research", "Facilities", "Training",
+              "Security", "Procurement", "Quality", "Forecasts", "Partnerships"]
+    aspects = ["Overview", "Findings", "Risks", "Methods", "Results", "Outlook", "Budget"]
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 40), "Synthetic Benchmark Report", fontname="helv", fontsize=8)
+        y = 60 + page_num % 5 * 3
+        for h in range(headings_per_page):
+            n = page_num * headings_per_page + h
+            page.insert_text((72, y), f"{topics[n % len(topics)]} {aspects[n // len(topics) % len(aspects)]} "
+                                      f"for Region {n // 91:04d}", fontname="hebo", fontsize=14 if h == 0 else 11)
+            y += 18
+            for _ in range(1 + (n * 5) % 3):
+                page.insert_text((72, y), "Body text describing the measurements, the method and the results "
+                                          f"observed for item {n}.", fontname="helv", fontsize=9)
+                y += 12
+            y += 6
+        page.insert_text((280, 810), f"Page {page_num + 1}", fontname="helv", fontsize=8)
+    doc.save(path)
+    doc.close()
+
+def bench_1a(pdf_paths, expected_dir=None, repeat=5):
+    """Extract every PDF serially; timings, outputs and their match with expected JSON files."""
+    extractor_module = load_module("extractor_1a", os.path.join(ROOT, "Challenge_1a", "1A.py"))
+    extractor = extractor_module.PDFStructureExtractor()
+    elapsed, latencies, structures = timed_passes(extractor.extract_document_structure, pdf_paths, repeat)
+    pages = page_count(pdf_paths)
+    outputs, matches = {}, {}
+    for pdf_path, structure in zip(pdf_paths, structures):
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        outputs[name] = digest(structure)
+        expected_path = os.path.join(expected_dir, name + ".json") if expected_dir else None
+        if expected_path and os.path.exists(expected_path):
+            with open(expected_path, "r", encoding="utf-8") as f:
+                matches[name] = json.load(f) == structure
+    return {
+        "documents": len(pdf_paths),
+        "pages": pages,
+        "pages_per_sec": round(pages / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "outputs": outputs,
+        "expected_matches": matches,
+    }
+
+def _ranked_key(section):
+    return section["document"], section["section_title"], section["page_number"]
+
+def bench_1b(collection_dir, model_path, repeat=5):
+    """Extract and chunk a collection, then embed and rank it if the model loads."""
+    sys.path.insert(0, os.path.join(ROOT, "Challenge_1b"))
+    pipeline = load_module("pipeline_1b", os.path.join(ROOT, "Challenge_1b", "1B.py"))
+    pdf_paths = sorted(glob.glob(os.path.join(collection_dir, "PDFs", "*.pdf")))
+    extractor = pipeline.PDFStructureExtractor()
+    elapsed, latencies, document_sections = timed_passes(
+        lambda pdf_path: pipeline.extract_document_sections(extractor, pdf_path), pdf_paths, repeat)
+    pages = page_count(pdf_paths)
+    sections = [section for doc_sections in document_sections for section in doc_sections or []]
+    result = {
+        "documents": len(pdf_paths),
+        "pages": pages,
+        "sections": len(sections),
+        "pages_per_sec": round(pages / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "outputs": {"sections": digest(sections)},
+    }
+
+    try:
+        model = pipeline.load_model(model_path)
+    except Exception as e:
+        result["ranking"] = f"skipped: model not loadable ({type(e).__name__})"
+        result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        return result
+    texts = [pipeline.section_text(section) for section in sections]
+    pipeline.embed_texts(model, texts[:8])  # warm up
+    embed_seconds = []
+    for _ in range(repeat):
+        embed_start = time.perf_counter()
+        pipeline.embed_texts(model, texts)
+        embed_seconds.append(time.perf_counter() - embed_start)
+    result["texts_per_sec"] = round(len(texts) / statistics.median(embed_seconds), 1)
+
+    persona, job = pipeline.load_challenge_config(os.path.join(collection_dir, "challenge1b_input.json"))
+    ranked = pipeline.rank_sections_for_persona(sections, persona, job, model_path, top_k=10)
+    output = pipeline.make_final_output(pdf_paths, persona, job, ranked, top_k=10)
+    result["outputs"]["ranking"] = digest(output["extracted_sections"])
+    reference_path = os.path.join(collection_dir, "challenge1b_output.json")
+    if os.path.exists(reference_path):
+        with open(reference_path, "r", encoding="utf-8") as f:
+            reference = json.load(f)
+        expected = [_ranked_key(section) for section in reference["extracted_sections"]]
+        found = {_ranked_key(section) for section in output["extracted_sections"]}
+        result["reference_overlap"] = f"{sum(key in found for key in expected)}/{len(expected)}"
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+def bench_memory(stage, pdf_path):
+    """Peak RSS of extracting one PDF's outline (stage "1a") or section chunks ("1b")."""
+    if stage == "1a":
+        extractor_module = load_module("extractor_1a", os.path.join(ROOT, "Challenge_1a", "1A.py"))
+        extractor_module.PDFStructureExtractor().extract_document_structure(pdf_path)
+    else:
+        sys.path.insert(0, os.path.join(ROOT, "Challenge_1b"))
+        pipeline = load_module("pipeline_1b", os.path.join(ROOT, "Challenge_1b", "1B.py"))
+        pipeline.extract_document_sections(pipeline.PDFStructureExtractor(), pdf_path)
+    return round(peak_rss_mb(), 1)
+
+def memory_scaling(stage, pdf_paths):
+    """Peak RSS at each MEMORY_PAGES size, each in a fresh process, and its growth per 1000 pages."""
+    rss = [run_isolated(bench_memory, stage, pdf_path) for pdf_path in pdf_paths]
+    growth = (rss[-1] - rss[0]) * 1000 / (MEMORY_PAGES[-1] - MEMORY_PAGES[0])
+    return {
+        "peak_rss_mb_by_pages": {str(pages): value for pages, value in zip(MEMORY_PAGES, rss)},
+        "rss_growth_mb_per_1000_pages": round(growth, 1),
+        "max_rss_growth_mb_per_1000_pages": MAX_RSS_GROWTH_MB[stage],
+    }
+
+def synthetic_pdf(pages):
+    """Path of a synthetic PDF with this many pages, generated once outside the repository."""
+    path = os.path.join(tempfile.gettempdir(), f"pdf_benchmark_synthetic_{pages}.pdf")
+    if not os.path.exists(path):
+        make_synthetic_pdf(path, pages=pages)
+    return path
+
+def run_isolated(func, *args):
+    """Run one benchmark in a fresh process so its peak RSS is its own."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(func, args)
+
+def matched(overlap):
+    """Sections matched out of a "matched/expected" reference_overlap."""
+    return int(overlap.split("/")[0])
+
+def compare(results, baseline, tolerance, check_timings=False):
+    """Print each metric next to its baseline; return the list of regressions.
+
+    Timing metrics are only regressions with check_timings; otherwise a slower
+    timing is marked but does not fail the run.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        print(f"\n{name}")
+        for metric, higher_is_better in METRICS.items():
+            if metric not in result:
+                continue
+            value = result[metric]
+            line = f"  {metric:>14}: {value}"
+            if base and metric in base and base[metric]:
+                change = (value - base[metric]) / base[metric]
+                worse = -change if higher_is_better else change
+                line += f"  (baseline {base[metric]}, {change:+.0%})"
+                if worse > tolerance:
+                    if metric in TIMING_METRICS and not check_timings:
+                        line += "  slower"
+                    else:
+                        line += "  REGRESSION"
+                        regressions.append(f"{name} {metric}")
+            print(line)
+        for key in ("documents", "pages", "sections", "reference_overlap", "ranking"):
+            if key in result:
+                print(f"  {key:>14}: {result[key]}")
+        if "rss_growth_mb_per_1000_pages" in result:
+            print(f"  {'peak_rss_mb':>14}: " + ", ".join(f"{value} at {pages} pages"
+                                                      for pages, value in result["peak_rss_mb_by_pages"].items()))
+            growth, limit = result["rss_growth_mb_per_1000_pages"], result["max_rss_growth_mb_per_1000_pages"]
+            print(f"  {'rss growth':>14}: {growth} MB per 1000 pages (limit {limit})" +
+                  ("  REGRESSION" if growth > limit else ""))
+            if growth > limit:
+                regressions.append(f"{name} rss growth")
+        mismatched = [doc for doc, ok in result.get("expected_matches", {}).items() if not ok]
+        if result.get("expected_matches"):
+            print(f"  {'expected':>14}: {len(result['expected_matches']) - len(mismatched)}/"
+                  f"{len(result['expected_matches'])} outputs match" +
+                  (f" (differ: {', '.join(mismatched)})" if mismatched else ""))
+        if base:
+            for output, value in result.get("outputs", {}).items():
+                if output in base.get("outputs", {}) and base["outputs"][output] != value:
+                    print(f"  output changed: {output}")
+                    regressions.append(f"{name} output {output}")
+            for doc, ok in result.get("expected_matches", {}).items():
+                if base.get("expected_matches", {}).get(doc) and not ok:
+                    regressions.append(f"{name} no longer matches expected {doc}")
+            if "ranking" in base.get("outputs", {}) and "ranking" not in result.get("outputs", {}):
+                print("  ranking did not run but the baseline has it")
+                regressions.append(f"{name} ranking not run")
+            if "reference_overlap" in base and "reference_overlap" in result and \
+                    matched(result["reference_overlap"]) < matched(base["reference_overlap"]):
+                print(f"  reference overlap fell from {base['reference_overlap']}")
+                regressions.append(f"{name} reference_overlap")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--skip-1b", action="store_true", help="only benchmark the 1A outline extractor")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown or RSS increase (default 0.2)")
+    parser.add_argument("--check-timings", action="store_true",
+                        help="fail on slower timings (only against a baseline saved on this machine)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes after the warm-up (default 5)")
+    parser.add_argument("--synthetic-pages", type=int, default=300, help="pages in the synthetic PDF")
+    args = parser.parse_args()
+    model_path = os.environ.get("MODEL_PATH", os.path.join(ROOT, "Challenge_1b", "local_model"))
+
+    results = {}
+    sample_dir = os.path.join(ROOT, "Challenge_1a", "sample_dataset")
+    results["1a sample_dataset"] = run_isolated(
+        bench_1a, sorted(glob.glob(os.path.join(sample_dir, "pdfs", "*.pdf"))), os.path.join(sample_dir, "outputs"),
+        args.repeat)
+    results["1a synthetic"] = run_isolated(bench_1a, [synthetic_pdf(args.synthetic_pages)], None, args.repeat)
+    memory_pdfs = [synthetic_pdf(pages) for pages in MEMORY_PAGES]
+    results["1a memory"] = memory_scaling("1a", memory_pdfs)
+    if not args.skip_1b:
+        for collection_dir in sorted(glob.glob(os.path.join(ROOT, "Challenge_1b", "Collection *"))):
+            results[f"1b {os.path.basename(collection_dir)}"] = run_isolated(
+                bench_1b, collection_dir, model_path, args.repeat)
+        results["1b memory"] = memory_scaling("1b", memory_pdfs)
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    check_timings = args.check_timings
+    if check_timings and baseline.get("machine") != machine():
+        print("Baseline was saved on another machine; timings are not checked")
+        check_timings = False
+    regressions = compare(results, baseline.get("results", {}), args.tolerance, check_timings)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine(), "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"\nSaved baseline to {BASELINE_PATH}")
+    elif regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    else:
+        print("\nNo regressions" + ("" if baseline else " (no baseline yet; run with --save-baseline)"))
@@ -0,0 +1,50 @@
+import importlib.util
+import os
+import random
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_extractor_module():
+    if "extractor_1a" in sys.modules:
+        return sys.modules["extractor_1a"]
+    spec = importlib.util.spec_from_file_location("extractor_1a", os.path.join(ROOT, "Challenge_1a", "1A.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["extractor_1a"] = module
+    spec.loader.exec_module(module)
+    return module
+
+extractor_module = load_extractor_module()
+
+def overlaps_by_scan(text, kept):
+    """The linear check _ContainmentIndex replaced in clean_and_filter_headings."""
+    return any(text in seen or seen in text for seen in kept)
+
+class ContainmentIndexTest(unittest.TestCase):
+    def test_matches_the_linear_scan_on_random_texts(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            # a small alphabet makes substrings in both directions common
+            alphabet = rng.choice(["ab", "abc", "ab c"])
+            index = extractor_module._ContainmentIndex()
+            kept = []
+            for _ in range(200):
+                text = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 14)))
+                expected = overlaps_by_scan(text, kept)
+                self.assertEqual(index.overlaps(text), expected, (text, kept))
+                # only texts of at least GRAM characters are ever kept
+                if not expected and len(text) >= index.GRAM:
+                    index.add(text)
+                    kept.append(text)
+
+    def test_finds_containment_in_both_directions(self):
+        index = extractor_module._ContainmentIndex()
+        index.add("Introduction to Testing")
+        self.assertTrue(index.overlaps("Testing"))
+        self.assertTrue(index.overlaps("1. Introduction to Testing Basics"))
+        self.assertTrue(index.overlaps("to"))
+        self.assertFalse(index.overlaps("Test Management"))
+
+if __name__ == "__main__":
+    unittest.main()
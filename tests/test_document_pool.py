@@ -0,0 +1,51 @@
+import glob
+import importlib.util
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDFS = sorted(glob.glob(os.path.join(ROOT, "Challenge_1a", "sample_dataset", "pdfs", "*.pdf")))
+CRASHING_PDF = "file03.pdf"
+
+def load_extractor_module():
+    # Registered under a fixed name so pool workers can unpickle tasks that refer to it
+    spec = importlib.util.spec_from_file_location("extractor_1a", os.path.join(ROOT, "Challenge_1a", "1A.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["extractor_1a"] = module
+    spec.loader.exec_module(module)
+    return module
+
+extractor_module = load_extractor_module()
+
+def crash_on_one_document(extractor, pdf_path):
+    """Extract a document's structure, but kill the worker on CRASHING_PDF."""
+    if os.path.basename(pdf_path) == CRASHING_PDF:
+        os._exit(1)
+    return extractor.extract_document_structure(pdf_path)
+
+class DocumentPoolCrashTest(unittest.TestCase):
+    def test_worker_crash_only_fails_its_own_document(self):
+        expected = [extractor_module.PDFStructureExtractor().extract_document_structure(pdf_path)
+                    for pdf_path in SAMPLE_PDFS]
+        results = extractor_module.map_documents(crash_on_one_document, SAMPLE_PDFS, workers=2)
+
+        for pdf_path, structure, (result, error) in zip(SAMPLE_PDFS, expected, results):
+            if os.path.basename(pdf_path) == CRASHING_PDF:
+                self.assertIsNone(result)
+                self.assertIn("crashed", error)
+            else:
+                self.assertIsNone(error, pdf_path)
+                self.assertEqual(result, structure)
+
+    def test_pool_keeps_serving_after_a_crash(self):
+        crashing = [pdf_path for pdf_path in SAMPLE_PDFS if os.path.basename(pdf_path) == CRASHING_PDF][0]
+        with extractor_module.DocumentPool(2) as pool:
+            _, error = pool.result(pool.submit(crash_on_one_document, crashing))
+            self.assertIsNotNone(error)
+            structure, error = pool.result(pool.submit(crash_on_one_document, SAMPLE_PDFS[0]))
+            self.assertIsNone(error)
+            self.assertIn("outline", structure)
+
+if __name__ == "__main__":
+    unittest.main()
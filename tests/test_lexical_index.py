@@ -0,0 +1,100 @@
+import importlib.util
+import math
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Challenge_1b"))
+
+from lexical_index import BM25Index, tokenize
+
+def load_pipeline_module():
+    # 1B.py is not a valid module name, so it is loaded from its path
+    spec = importlib.util.spec_from_file_location("pipeline_1b", os.path.join(ROOT, "Challenge_1b", "1B.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+pipeline = load_pipeline_module()
+
+TEXTS = [
+    "hotel booking guide",
+    "hotel hotel reviews",
+    "pasta recipes",
+    "packing tips",
+]
+
+def reversed_dense_rank(sections, persona, job, model_path, embedding_cache=None, top_k=None,
+                        batch_size=None, quantize=False):
+    """Stand-in for the embedding ranker: the shortlist in reverse order."""
+    ranked = list(reversed(sections))
+    for rank, section in enumerate(ranked):
+        section['similarity'] = 1.0 - rank / len(ranked)
+    return ranked if top_k is None else ranked[:top_k]
+
+class TokenizeTest(unittest.TestCase):
+    def test_drops_stopwords_and_plural_s(self):
+        self.assertEqual(tokenize("Guides for the Trips and Hotels"), ["guide", "trip", "hotel"])
+
+    def test_keeps_short_words_and_double_s(self):
+        self.assertEqual(tokenize("bus boss 2024"), ["bus", "boss", "2024"])
+
+class BM25IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = BM25Index.build(TEXTS)
+
+    def test_ranks_by_term_frequency_then_text_order(self):
+        self.assertEqual(self.index.top_n("hotel", 4).tolist(), [1, 0, 2, 3])
+        self.assertEqual(self.index.top_n("hotel", 1).tolist(), [1])
+
+    def test_scores_match_the_bm25_formula(self):
+        scores = self.index.scores("hotel")
+        idf = math.log(1 + (4 - 2 + 0.5) / (2 + 0.5))
+        average_length = (3 + 3 + 2 + 2) / 4
+        norm = 1.2 * (1 - 0.75 + 0.75 * 3 / average_length)
+        self.assertAlmostEqual(float(scores[0]), idf * 1 * 2.2 / (1 + norm), places=5)
+        self.assertAlmostEqual(float(scores[1]), idf * 2 * 2.2 / (2 + norm), places=5)
+        self.assertEqual(scores[2:].tolist(), [0.0, 0.0])
+
+    def test_unknown_terms_score_zero(self):
+        self.assertEqual(self.index.scores("the submarine").tolist(), [0.0] * len(TEXTS))
+
+class HybridRankingTest(unittest.TestCase):
+    def sections(self):
+        return [{"document": "doc.pdf", "heading": f"Section {i}", "page": 1, "chunk": text}
+                for i, text in enumerate(TEXTS)]
+
+    def rank(self, sections, **kwargs):
+        with mock.patch.object(pipeline, "rank_sections_for_persona", reversed_dense_rank):
+            return pipeline.rank_sections_hybrid(sections, "Traveller", "Find a hotel", "unused-model",
+                                                 top_k=3, candidates=3, **kwargs)
+
+    def test_without_fusion_the_shortlist_is_dense_ranked(self):
+        # BM25 shortlist is sections 1, 0, 2; the dense stand-in reverses it
+        ranked = self.rank(self.sections())
+        self.assertEqual([section["chunk"] for section in ranked], [TEXTS[2], TEXTS[0], TEXTS[1]])
+
+    def test_rrf_fuses_lexical_and_dense_ranks(self):
+        ranked = self.rank(self.sections(), fusion="rrf")
+        k = pipeline.RRF_K
+        # sections 2 and 1 swap ranks between the two lists and tie; the dense order breaks the tie
+        self.assertEqual([section["chunk"] for section in ranked], [TEXTS[2], TEXTS[1], TEXTS[0]])
+        self.assertAlmostEqual(ranked[0]["fusion_score"], 1 / (k + 1) + 1 / (k + 3))
+        self.assertAlmostEqual(ranked[2]["fusion_score"], 2 / (k + 2))
+
+    def test_prebuilt_lexical_index_gives_the_same_ranking(self):
+        sections = self.sections()
+        expected = self.rank(self.sections(), fusion="rrf")
+        ranked = self.rank(sections, fusion="rrf", lexical_index=pipeline.build_lexical_index(sections))
+        self.assertEqual(ranked, expected)
+
+    def test_rejects_mismatched_index_and_unknown_fusion(self):
+        with self.assertRaises(ValueError):
+            self.rank(self.sections(), lexical_index=BM25Index.build(TEXTS[:2]))
+        with self.assertRaises(ValueError):
+            self.rank(self.sections(), fusion="linear")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Challenge_1b"))
+
+from manifest import CollectionManifest
+
+def sections_of(name):
+    return [{"document": name, "heading": "Introduction", "page": 1, "chunk": f"Body of {name}"}]
+
+class CollectionManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.manifest_path = os.path.join(self.tmp.name, "cache", "manifest.json")
+        self.pdf_files = [self.write_pdf(name, b"%PDF " + name.encode()) for name in ("a.pdf", "b.pdf", "c.pdf")]
+
+    def write_pdf(self, name, content, mtime_ns=None):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def recorded_manifest(self, config_version="1"):
+        manifest = CollectionManifest(self.manifest_path, config_version)
+        stale, _ = manifest.refresh(self.pdf_files)
+        for pdf_path in stale:
+            manifest.record(pdf_path, sections_of(os.path.basename(pdf_path)))
+        manifest.save()
+        return CollectionManifest(self.manifest_path, config_version)
+
+    def test_new_manifest_extracts_everything(self):
+        manifest = CollectionManifest(self.manifest_path, "1")
+        self.assertEqual(manifest.refresh(self.pdf_files), (self.pdf_files, []))
+
+    def test_unchanged_collection_needs_nothing(self):
+        manifest = self.recorded_manifest()
+        self.assertEqual(manifest.refresh(self.pdf_files), ([], []))
+        self.assertEqual(manifest.sections(self.pdf_files),
+                         [section for pdf_path in self.pdf_files for section in sections_of(os.path.basename(pdf_path))])
+
+    def test_modified_pdf_is_stale_and_its_entry_dropped(self):
+        manifest = self.recorded_manifest()
+        # same size, so only the digest tells it apart
+        self.write_pdf("b.pdf", b"%PDF B.pdf", mtime_ns=os.stat(self.pdf_files[1]).st_mtime_ns + 10 ** 9)
+        stale, removed = manifest.refresh(self.pdf_files)
+        self.assertEqual((stale, removed), ([self.pdf_files[1]], []))
+        # a failed re-extraction must not bring back the previous version's sections
+        self.assertNotIn("b.pdf", manifest.documents)
+        self.assertEqual([section["document"] for section in manifest.sections(self.pdf_files)], ["a.pdf", "c.pdf"])
+
+    def test_touched_but_identical_pdf_is_kept(self):
+        manifest = self.recorded_manifest()
+        stat = os.stat(self.pdf_files[0])
+        self.write_pdf("a.pdf", b"%PDF a.pdf", mtime_ns=stat.st_mtime_ns + 10 ** 9)
+        self.assertEqual(manifest.refresh(self.pdf_files), ([], []))
+        self.assertEqual(manifest.documents["a.pdf"]["mtime_ns"], stat.st_mtime_ns + 10 ** 9)
+
+    def test_removed_pdf_entries_are_dropped(self):
+        manifest = self.recorded_manifest()
+        os.remove(self.pdf_files[2])
+        self.assertEqual(manifest.refresh(self.pdf_files[:2]), ([], ["c.pdf"]))
+        self.assertEqual(sorted(manifest.documents), ["a.pdf", "b.pdf"])
+
+    def test_record_without_headings_stores_no_sections(self):
+        manifest = CollectionManifest(self.manifest_path, "1")
+        manifest.record(self.pdf_files[0], None)
+        self.assertEqual(manifest.documents["a.pdf"]["sections"], [])
+        self.assertEqual(manifest.documents["a.pdf"]["embedding_ids"], [])
+
+    def test_other_config_version_invalidates_every_entry(self):
+        self.recorded_manifest("1")
+        manifest = CollectionManifest(self.manifest_path, "2")
+        self.assertEqual(manifest.refresh(self.pdf_files), (self.pdf_files, []))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Challenge_1b"))
+
+from vector_index import VectorIndex, load_combined_index, top_k_indices
+
+def random_index(n_rows, seed, model_id="model-a", dim=16):
+    rng = np.random.default_rng(seed)
+    sections = [{"document": f"doc{seed}.pdf", "heading": f"Heading {i}", "page": i, "chunk": f"text {i}"}
+                for i in range(n_rows)]
+    return VectorIndex.build(sections, rng.standard_normal((n_rows, dim)), model_id)
+
+class TopKIndicesTest(unittest.TestCase):
+    def test_matches_a_stable_full_sort(self):
+        scores = np.array([0.5, 0.9, 0.5, 0.1, 0.9, 0.5], dtype=np.float32)
+        expected = sorted(range(len(scores)), key=lambda i: -scores[i])
+        for top_k in range(len(scores) + 2):
+            self.assertEqual(top_k_indices(scores, top_k).tolist(), expected[:top_k])
+
+class VectorIndexTest(unittest.TestCase):
+    def test_save_and_load_round_trip(self):
+        index = random_index(50, seed=1)
+        index.build_ivf(n_lists=5)
+        with tempfile.TemporaryDirectory() as index_dir:
+            index.save(index_dir)
+            for mmap in (True, False):
+                loaded = VectorIndex.load(index_dir, mmap=mmap)
+                np.testing.assert_array_equal(np.asarray(loaded.vectors), index.vectors)
+                self.assertEqual(loaded.records, index.records)
+                self.assertEqual(loaded.model_id, "model-a")
+                np.testing.assert_array_equal(loaded.list_rows, index.list_rows)
+                np.testing.assert_array_equal(loaded.list_offsets, index.list_offsets)
+
+    def test_concatenate_keeps_rows_and_ivf_lists(self):
+        first, second = random_index(30, seed=1), random_index(20, seed=2)
+        first.build_ivf(n_lists=4)
+        second.build_ivf(n_lists=3)
+        combined = VectorIndex.concatenate([first, second])
+        self.assertEqual(len(combined), 50)
+        self.assertEqual(combined.records, first.records + second.records)
+        np.testing.assert_array_equal(combined.vectors[30:], second.vectors)
+        self.assertEqual(len(combined.centroids), 7)
+        self.assertEqual(sorted(combined.list_rows.tolist()), list(range(50)))
+        # every list of the second index now points at its rows offset by the first index's length
+        np.testing.assert_array_equal(combined.list_rows[combined.list_offsets[4]:], second.list_rows + 30)
+
+    def test_concatenate_without_ivf_everywhere_has_none(self):
+        first = random_index(10, seed=1)
+        first.build_ivf(n_lists=2)
+        combined = VectorIndex.concatenate([first, random_index(10, seed=2)])
+        self.assertIsNone(combined.centroids)
+
+    def test_concatenate_rejects_different_models(self):
+        with self.assertRaises(ValueError):
+            VectorIndex.concatenate([random_index(5, seed=1), random_index(5, seed=2, model_id="model-b")])
+
+    def test_ivf_search_probing_every_list_matches_exact_search(self):
+        index = random_index(500, seed=3)
+        index.build_ivf(n_lists=20)
+        rng = np.random.default_rng(4)
+        for query in rng.standard_normal((10, 16)):
+            exact = index.search(query, top_k=10)
+            approximate = index.search(query, top_k=10, n_probe=20)
+            self.assertEqual([row for row, _ in approximate], [row for row, _ in exact])
+            np.testing.assert_allclose([score for _, score in approximate], [score for _, score in exact], rtol=1e-5)
+
+    def test_combined_index_is_clustered_once(self):
+        with tempfile.TemporaryDirectory() as root:
+            index_dirs = [os.path.join(root, name) for name in ("a", "b")]
+            for seed, index_dir in enumerate(index_dirs):
+                random_index(40, seed=seed).save(index_dir)
+            combined_dir = os.path.join(root, "combined")
+            combined = load_combined_index(index_dirs, combined_dir, n_lists=4)
+            self.assertEqual(len(combined), 80)
+            self.assertIsNotNone(combined.centroids)
+            mtime = os.stat(os.path.join(combined_dir, "ivf_centroids.npy")).st_mtime_ns
+            load_combined_index(index_dirs, combined_dir, n_lists=4)
+            self.assertEqual(os.stat(os.path.join(combined_dir, "ivf_centroids.npy")).st_mtime_ns, mtime)
+
+if __name__ == "__main__":
+    unittest.main()